@@ -1,27 +1,60 @@
 # app.py
-from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi import FastAPI, Header, HTTPException, Request
+from pydantic import BaseModel, Field
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.datastructures import Headers
 
 from dotenv import load_dotenv
 import google.generativeai as genai
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import datetime
+import hashlib
+import hmac
+import itertools
+import inspect
 import json
 import re
 import os
+import sys
 import requests
-from pypdf import PdfReader
 from pathlib import Path
-import gradio as gr
+from typing import Annotated, List, Optional
+import coalesce
+import conversation
+import http_cache
+import intents
+import logs
+import metrics
+import notifications
+import profile_artifact
+import ratelimit
+import response_cache
+import retrieval
+import router
+import scope
+import sessions
+import tool_calls
 import ssl
 import logging
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process, nothing to coordinate
+    fcntl = None
+
 ssl._create_default_https_context = ssl._create_unverified_context
 
 load_dotenv(override=True)
 
-# Basic structured logging so we can diagnose push failures and tool calls
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+# Text or JSON log lines, written by a background thread (see logs.py);
+# LOG_FORMAT, LOG_LEVEL, LOG_SAMPLE_RATE and LOG_REDACT_PII configure it.
+logs.configure()
 
 # Diagnostic block - google.genai doesn't exist, using google.generativeai instead
 # try:
@@ -34,19 +67,22 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(mess
 # except Exception as _e:
 #     logging.warning("Failed to import google.genai for diagnostics: %s", _e)
 
-# Basic structured logging so we can diagnose push failures and tool calls
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logging.info("google.generativeai version: %s", getattr(genai, "__version__", "unknown"))
-logging.info("genai attrs: %s", ",".join([a for a in dir(genai) if 'generate' in a.lower() or 'generative' in a.lower()]))
+
+if __name__ == "__main__" and sys.argv[1:2] == ["build-profile"]:
+    # Offline build step (e.g. Render's buildCommand); needs no API key.
+    sys.exit(profile_artifact.main(sys.argv[2:]))
 
 api_key = os.getenv("GEMINI_API_KEY")
-logging.info("GEMINI_API_KEY value seen by app: %r", api_key)
 
 if not api_key:
     raise RuntimeError("GEMINI_API_KEY is not set or empty in this environment")
 
 # Configure the google.generativeai client and use GenerativeModel.generate_content
 genai.configure(api_key=api_key)
+if hasattr(os, "register_at_fork"):
+    # gRPC channels must not be shared across fork (gunicorn --preload); each worker builds its own
+    os.register_at_fork(after_in_child=lambda: genai.configure(api_key=api_key))
 
 # Log notification service configuration at startup
 def log_notification_config():
@@ -58,7 +94,7 @@ def log_notification_config():
     
     logging.info("=== Notification Service Configuration ===")
     if tg_token and tg_chat:
-        logging.info("✓ Telegram configured: bot_token=%s... chat_id=%s", tg_token[:20], tg_chat)
+        logging.info("✓ Telegram configured: chat_id=%s", tg_chat)
     else:
         logging.warning("✗ Telegram NOT configured")
     
@@ -74,55 +110,278 @@ def get_available_models():
     try:
         import google.generativeai as genai_models
         models = genai_models.list_models()
-        available = [m.name for m in models]
+        # bare names ("gemini-2.5-flash") of models that can answer chat requests
+        available = [
+            m.name.removeprefix("models/") for m in models
+            if "generateContent" in (getattr(m, "supported_generation_methods", None) or [])
+        ]
         logging.info("Available models: %s", available)
         return available
     except Exception as e:
         logging.error("Failed to list models: %s", e)
         return []
 
-def call_gemini(prompt, model_name="gemini-2.5-flash"):
-    """Call Gemini via google.generativeai.GenerativeModel.generate_content.
-    Try a couple of common parameter shapes for compatibility across SDK versions.
-    Returns the raw response object.
-    """
-    Gen = getattr(genai, "GenerativeModel", None)
-    if not Gen:
-        raise RuntimeError("google.generativeai.GenerativeModel not available in this environment")
-    model = Gen(model_name)
-    
-    # Set generation config with higher token limit to avoid truncation
-    generation_config = {
-        "temperature": 0.7,
-        "top_p": 0.95,
-        "top_k": 40,
-        "max_output_tokens": 2048,  # Increased from default to prevent truncation
-    }
-    
-    # Try simple string argument first
+DEFAULT_MODEL = "gemini-2.5-flash"
+# Cheaper, faster model for short first questions (see router.py); empty disables it.
+FAST_MODEL = os.getenv("FAST_MODEL", "gemini-2.5-flash-lite")
+
+# Local runtime state (caches, notification spool, ...). Not part of the repo.
+STATE_DIR = Path(os.getenv("STATE_DIR", str(Path(__file__).resolve().parent / ".state")))
+
+# Back-pressure for /chat: at most MAX_INFLIGHT_CHATS requests talk to the model at
+# once; others wait up to CHAT_QUEUE_TIMEOUT seconds for a slot, then get a 429.
+MAX_INFLIGHT_CHATS = int(os.getenv("MAX_INFLIGHT_CHATS", "8"))
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "2"))
+CHAT_RETRY_AFTER = int(os.getenv("CHAT_RETRY_AFTER", "5"))
+
+# ========== METRICS ==========
+# Served in Prometheus text format at /metrics (see metrics.py). Counts that
+# other components keep themselves are registered as callbacks next to the route.
+metrics_registry = metrics.Registry()
+CHAT_SECONDS = metrics_registry.histogram(
+    "chat_request_seconds", "End-to-end chat request latency, including queueing.", ["route"])
+PROMPT_BUILD_SECONDS = metrics_registry.histogram(
+    "prompt_build_seconds", "Time to build the model input (retrieval and history window).")
+GEMINI_SECONDS = metrics_registry.histogram(
+    "gemini_request_seconds", "Gemini call latency until the whole reply has arrived.", ["model", "mode"])
+GEMINI_TTFT_SECONDS = metrics_registry.histogram(
+    "gemini_time_to_first_token_seconds", "Time from starting a streamed Gemini call to its first text.", ["model"])
+TOOL_SECONDS = metrics_registry.histogram(
+    "tool_execution_seconds", "Tool call execution time.", ["tool"])
+NOTIFICATION_SECONDS = metrics_registry.histogram(
+    "notification_send_seconds", "Time to deliver one notification via Telegram/Pushover.", ["outcome"])
+REPLIES = metrics_registry.counter(
+    "chat_replies_total", "Replies by source: canned, scope pre-classifier, reply cache, or a model generation.", ["source"])
+FALLBACK_TRIGGERS = metrics_registry.counter(
+    "fallback_phrase_triggers_total", "Replies whose wording triggered an unknown-question record.", ["path"])
+NON_ANSWERS = metrics_registry.counter(
+    "non_answer_replies_total", "Replies replaced by the non-answer message (SDK JSON or too short).", ["reason"])
+TRUNCATIONS = metrics_registry.counter(
+    "gemini_truncated_replies_total", "Replies cut off at max_output_tokens (finish_reason MAX_TOKENS).", ["model"])
+TOKENS = metrics_registry.counter(
+    "gemini_tokens_total", "Tokens reported in Gemini usage_metadata.", ["model", "kind"])
+RATE_LIMITED = metrics_registry.counter(
+    "rate_limited_total", "Requests and alerts turned away by admission control.", ["scope"])
+
+USAGE_FIELDS = (
+    ("prompt", "prompt_token_count"),
+    ("output", "candidates_token_count"),
+    ("cached", "cached_content_token_count"),
+    ("total", "total_token_count"),
+)
+
+def observe_response(response, model_name):
+    """Count token usage and truncation for a Gemini response (or the last chunk of a stream)."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        for kind, field in USAGE_FIELDS:
+            count = getattr(usage, field, 0) or 0
+            if count:
+                TOKENS.inc(count, model=model_name, kind=kind)
+        token_budget.spend(getattr(usage, "total_token_count", 0) or 0)
     try:
-        return model.generate_content(prompt, generation_config=generation_config)
-    except TypeError:
-        # Some versions expect a dict or list of content blocks
+        candidates = response.candidates or []
+    except Exception:
+        candidates = []
+    for candidate in candidates:
+        finish_reason = getattr(candidate, "finish_reason", None)
+        if finish_reason is not None and getattr(finish_reason, "name", str(finish_reason)).upper() in ("MAX_TOKENS", "LENGTH"):
+            TRUNCATIONS.inc(model=model_name)
+            logging.warning("Response may be truncated due to token limit. Finish reason: %s", finish_reason)
+
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 2048,  # Increased from default to prevent truncation
+}
+
+# Per-model generation settings. Every model listed here is built at startup;
+# models requested later fall back to GENERATION_CONFIG.
+MODEL_GENERATION_CONFIGS = {
+    DEFAULT_MODEL: GENERATION_CONFIG,
+}
+if FAST_MODEL:
+    MODEL_GENERATION_CONFIGS[FAST_MODEL] = GENERATION_CONFIG
+
+
+# Optional Gemini context caching for the persona system prompt. When enabled,
+# the system instruction is uploaded once as CachedContent and reused until the
+# TTL runs out; if the provider refuses (model unsupported, prompt below the
+# minimum cacheable size, ...) the instruction is sent inline instead.
+CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() == "true"
+CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
+
+class ModelRegistry:
+    """Builds each GenerativeModel once and remembers how the SDK wants to be called.
+
+    The generation config and system instruction are bound to the model at
+    construction time; a model is rebuilt only when its system instruction
+    changes (or its context cache is about to expire). The argument shape of
+    generate_content (positional contents vs. the legacy ``inputs=`` keyword)
+    is probed once from the SDK signature instead of being discovered through
+    TypeErrors on every request.
+    """
+
+    def __init__(self, configs, tools=None):
+        self.configs = dict(configs)
+        self.tools = tools
+        self._models = {}
+        self._context_cached = set()
+        self._lock = threading.Lock()
+        self.call_shape = None
+
+    def config_for(self, model_name):
+        return self.configs.get(model_name, GENERATION_CONFIG)
+
+    def warm(self, system_instruction=None):
+        for model_name in self.configs:
+            self.get(model_name, system_instruction)
+
+    def get(self, model_name, system_instruction=None):
+        fingerprint = hashlib.sha256(system_instruction.encode("utf-8")).hexdigest() if system_instruction else None
+        entry = self._models.get(model_name)
+        if entry is not None and self._is_fresh(entry, fingerprint):
+            return entry[1]
+        with self._lock:
+            entry = self._models.get(model_name)
+            if entry is None or not self._is_fresh(entry, fingerprint):
+                Gen = getattr(genai, "GenerativeModel", None)
+                if not Gen:
+                    raise RuntimeError("google.generativeai.GenerativeModel not available in this environment")
+                model, expires_at = self._build(Gen, model_name, system_instruction)
+                if self.call_shape is None:
+                    self.call_shape = self._probe_call_shape(model)
+                    logging.info("Gemini generate_content call shape: %s", self.call_shape)
+                entry = (fingerprint, model, expires_at)
+                self._models[model_name] = entry
+                logging.info("Built GenerativeModel %s", model_name)
+        return entry[1]
+
+    @staticmethod
+    def _is_fresh(entry, fingerprint):
+        cached_fingerprint, _, expires_at = entry
+        if cached_fingerprint != fingerprint:
+            return False
+        return expires_at is None or time.monotonic() < expires_at
+
+    def _build(self, Gen, model_name, system_instruction):
+        config = self.config_for(model_name)
+        if system_instruction and CONTEXT_CACHE_ENABLED:
+            try:
+                cached = genai.caching.CachedContent.create(
+                    model=model_name,
+                    display_name="persona-system-prompt",
+                    system_instruction=system_instruction,
+                    tools=self.tools,
+                    ttl=datetime.timedelta(seconds=CONTEXT_CACHE_TTL),
+                )
+                logging.info("Registered context cache %s for %s", cached.name, model_name)
+                self._context_cached.add(model_name)
+                # rebuild a minute early so requests never reference an expired cache
+                return Gen.from_cached_content(cached, generation_config=config), time.monotonic() + CONTEXT_CACHE_TTL - 60
+            except Exception as e:
+                logging.warning("Context caching unavailable for %s, sending system instruction inline: %s", model_name, e)
+        self._context_cached.discard(model_name)
+        return Gen(model_name, generation_config=config, system_instruction=system_instruction, tools=self.tools), None
+
+    @staticmethod
+    def _probe_call_shape(model):
         try:
-            return model.generate_content({"content": prompt}, generation_config=generation_config)
-        except Exception:
-            # last resort: try a named argument
-            return model.generate_content(inputs=prompt, generation_config=generation_config)
-   
+            params = inspect.signature(model.generate_content).parameters
+        except (TypeError, ValueError):
+            return "positional"
+        if "contents" not in params and "inputs" in params:
+            return "inputs"
+        return "positional"
+
+    def _args(self, model_name, prompt, kwargs):
+        if model_name in self._context_cached:
+            # tool settings are fixed by the cached content and can't be overridden per request
+            kwargs.pop("tool_config", None)
+        if self.call_shape == "inputs":
+            return (), {"inputs": prompt, **kwargs}
+        return (prompt,), kwargs
+
+    def generate(self, prompt, model_name=DEFAULT_MODEL, system_instruction=None, **kwargs):
+        model = self.get(model_name, system_instruction)
+        args, call_kwargs = self._args(model_name, prompt, kwargs)
+        return model.generate_content(*args, **call_kwargs)
+
+    async def generate_async(self, prompt, model_name=DEFAULT_MODEL, system_instruction=None, **kwargs):
+        model = self.get(model_name, system_instruction)
+        args, call_kwargs = self._args(model_name, prompt, kwargs)
+        return await model.generate_content_async(*args, **call_kwargs)
+
+
+def call_gemini(prompt, model_name=DEFAULT_MODEL, system_instruction=None, **kwargs):
+    """Call Gemini via the shared model registry. Returns the raw response object."""
+    with GEMINI_SECONDS.time(model=model_name, mode="unary"):
+        response = model_registry.generate(prompt, model_name, system_instruction, **kwargs)
+    observe_response(response, model_name)
+    return response
+
+async def call_gemini_async(prompt, model_name=DEFAULT_MODEL, system_instruction=None, **kwargs):
+    """Non-blocking counterpart of call_gemini()."""
+    with GEMINI_SECONDS.time(model=model_name, mode="unary"):
+        response = await model_registry.generate_async(prompt, model_name, system_instruction, **kwargs)
+    # debits the token budget, which may be a SQLite store
+    await asyncio.to_thread(observe_response, response, model_name)
+    return response
+
+async def call_gemini_stream(prompt, model_name=DEFAULT_MODEL, system_instruction=None, function_calls=None, **kwargs):
+    """Async generator yielding reply text pieces as Gemini produces them.
+
+    Function calls found in the stream are appended to ``function_calls``
+    when a list is passed.
+    """
+    started = time.perf_counter()
+    first_text = True
+    last_chunk = None
+    with GEMINI_SECONDS.time(model=model_name, mode="stream"):
+        response = await model_registry.generate_async(prompt, model_name, system_instruction, stream=True, **kwargs)
+        async for chunk in response:
+            last_chunk = chunk
+            if function_calls is not None:
+                function_calls.extend(function_calls_in(chunk))
+            try:
+                text = chunk.text
+            except Exception:
+                # chunks carrying only finish/safety metadata have no text parts
+                text = ""
+            if text:
+                if first_text:
+                    first_text = False
+                    GEMINI_TTFT_SECONDS.observe(time.perf_counter() - started, model=model_name)
+                yield text
+    if last_chunk is not None:
+        # usage and finish_reason for the whole stream arrive on the final chunk
+        await asyncio.to_thread(observe_response, last_chunk, model_name)
+
+# One pooled HTTP session for all notification traffic, so repeated sends reuse
+# TLS connections to Telegram/Pushover instead of reconnecting every time.
+http_session = requests.Session()
+http_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=4))
+
+# Overridable so bench_load.py (or a staging setup) can point at a local stub.
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+PUSHOVER_API_URL = os.getenv("PUSHOVER_API_URL", "https://api.pushover.net/1/messages.json")
+
 def push(text):
+    """Send one notification synchronously. Chat code should go through `dispatcher` instead."""
     tg_token = os.getenv("TELEGRAM_BOT_TOKEN")
     tg_chat = os.getenv("TELEGRAM_CHAT_ID")
     if tg_token and tg_chat:
         try:
             logging.info("Attempting Telegram send to chat %s", tg_chat)
-            url = f"https://api.telegram.org/bot{tg_token}/sendMessage"
+            url = f"{TELEGRAM_API_URL}/bot{tg_token}/sendMessage"
             payload = {"chat_id": tg_chat, "text": text}
             logging.debug("Telegram URL: %s", url)
             logging.debug("Telegram payload: %s", payload)
             
             # Try with JSON first (more reliable)
-            r = requests.post(url, json=payload, timeout=10, verify=False)
+            r = http_session.post(url, json=payload, timeout=10, verify=False)
             
             logging.info("Telegram response status: %s", r.status_code)
             if r.status_code == 200:
@@ -134,7 +393,7 @@ def push(text):
             
             # Try with data format as fallback
             logging.info("Trying Telegram with data format...")
-            r2 = requests.post(url, data=payload, timeout=10, verify=False)
+            r2 = http_session.post(url, data=payload, timeout=10, verify=False)
             if r2.status_code == 200:
                 logging.info("✓ Telegram sent successfully (data format)")
                 return True
@@ -164,8 +423,8 @@ def push(text):
     masked_token = token[:4] + "..." + token[-4:] if len(token) > 8 else "<masked>"
     logging.info("Attempting Pushover send (token=%s, user=%s)", masked_token, user)
     try:
-        r = requests.post(
-            "https://api.pushover.net/1/messages.json",
+        r = http_session.post(
+            PUSHOVER_API_URL,
             json={
                 "token": token,
                 "user": user,
@@ -197,23 +456,57 @@ def push(text):
         return False
 
 
+def notifications_configured():
+    return bool(
+        (os.getenv("TELEGRAM_BOT_TOKEN") and os.getenv("TELEGRAM_CHAT_ID"))
+        or (os.getenv("PUSHOVER_TOKEN") and os.getenv("PUSHOVER_USER"))
+    )
+
+def timed_push(text):
+    started = time.perf_counter()
+    sent = False
+    try:
+        sent = push(text)
+        return sent
+    finally:
+        NOTIFICATION_SECONDS.observe(time.perf_counter() - started, outcome="sent" if sent else "failed")
+
+# push() runs on the dispatcher's worker thread; chat requests only enqueue.
+dispatcher = notifications.NotificationDispatcher(
+    timed_push,
+    spool_dir=STATE_DIR / "notifications",
+    max_attempts=int(os.getenv("NOTIFY_MAX_ATTEMPTS", "5")),
+    backoff_base=float(os.getenv("NOTIFY_BACKOFF_BASE", "2")),
+    coalesce_window=float(os.getenv("NOTIFY_COALESCE_WINDOW", "3")),
+)
+
+# set for batch runs (see Me.chat_batch), whose questions don't come from visitors
+_notifications_muted = contextvars.ContextVar("notifications_muted", default=False)
+
+def notify(kind, text):
+    if _notifications_muted.get():
+        logging.info("Notification muted for this batch run: %s", kind)
+        return False
+    if not notifications_configured():
+        logging.warning("✗ Neither Telegram nor Pushover configured; dropping notification")
+        return False
+    dispatcher.enqueue(kind, text)
+    return True
+
 def record_user_details(email, name="Name not provided", notes="not provided"):
     logging.info("record_user_details called with email=%s name=%s notes=%s", email, name, notes)
-    success = push(f"Recording {name} with email {email} and notes {notes}")
-    if not success:
-        logging.warning("Recording saved locally but push failed for email=%s", email)
-    return {"recorded": "ok", "pushover_sent": bool(success)}
+    queued = notify(notifications.USER_DETAILS, f"Recording {name} with email {email} and notes {notes}")
+    return {"recorded": "ok", "notification_queued": queued}
 
 def record_unknown_question(question):
     logging.info("record_unknown_question called: %s", question)
-    logging.info("About to call push() for question: %s", question)
-    success = push(f"Recording unknown question: {question}")
-    logging.info("push() returned: %s for question: %s", success, question)
-    if not success:
-        logging.warning("✗ Failed to send notification for unknown question")
-    else:
-        logging.info("✓ Successfully notified about unknown question")
-    return {"recorded": "ok", "pushover_sent": bool(success), "notification_sent": bool(success)}
+    if unknown_question_limiter.check(ratelimit.current_client()):
+        # the model can be talked into calling this in a loop; don't page the owner for it
+        RATE_LIMITED.inc(scope="unknown_question")
+        logging.warning("Unknown-question alerts from this client are rate limited; not notifying")
+        return {"recorded": "rate_limited", "notification_queued": False}
+    queued = notify(notifications.UNKNOWN_QUESTION, question)
+    return {"recorded": "ok", "notification_queued": queued}
 
 record_user_details_json = {
     "name": "record_user_details",
@@ -256,8 +549,199 @@ record_unknown_question_json = {
     }
 }
 
-tools = [{"type": "function", "function": record_user_details_json},
-        {"type": "function", "function": record_unknown_question_json}]
+def gemini_function_declaration(spec):
+    # Gemini's Schema has no additionalProperties; the rest maps across as is
+    parameters = {k: v for k, v in spec["parameters"].items() if k != "additionalProperties"}
+    return {**spec, "parameters": parameters}
+
+tools = [{"function_declarations": [
+    gemini_function_declaration(record_user_details_json),
+    gemini_function_declaration(record_unknown_question_json),
+]}]
+
+# Native Gemini function calling: the model returns function_call parts, the
+# tools run concurrently, and their results go back in one follow-up turn.
+# With NATIVE_TOOLS=false the model is given no declarations and only the
+# JSON-in-text convention remains (parsed either way, see tool_calls.py).
+NATIVE_TOOLS = os.getenv("NATIVE_TOOLS", "true").lower() == "true"
+
+# Seconds a tool may run before the reply goes ahead without its result. The
+# tools only enqueue notifications, so anything slower is a stuck notifier.
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "3"))
+TOOL_TIMEOUTS = {
+    "record_user_details": TOOL_TIMEOUT,
+    "record_unknown_question": TOOL_TIMEOUT,
+}
+tool_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="tool")
+
+# The follow-up turn after tool results must be answered in text.
+NO_MORE_TOOLS = {"function_calling_config": {"mode": "NONE"}}
+
+model_registry = ModelRegistry(MODEL_GENERATION_CONFIGS, tools=tools if NATIVE_TOOLS else None)
+
+# Model routing (see router.py). HEDGE_AFTER is a number of seconds, "p95" to
+# hedge once a call outlives the model's rolling p95, or empty to disable.
+def parse_hedge_after(value):
+    value = value.strip().lower()
+    if not value:
+        return None
+    return value if value == "p95" else float(value)
+
+model_router = router.ModelRouter(
+    DEFAULT_MODEL,
+    fast=FAST_MODEL or None,
+    short_question_chars=int(os.getenv("SHORT_QUESTION_CHARS", "80")),
+    max_error_rate=float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5")),
+    hedge_after=parse_hedge_after(os.getenv("HEDGE_AFTER", "")),
+)
+MODEL_LIST_CACHE = STATE_DIR / "models.json"
+
+
+# How profile documents reach the model: "retrieval" sends only the top-k
+# BM25-ranked chunks with each question, "full" puts every document in the
+# system prompt.
+PROFILE_CONTEXT = os.getenv("PROFILE_CONTEXT", "retrieval").lower()
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+
+# Local scope pre-classifier (see scope.py): questions it scores at least
+# SCOPE_THRESHOLD likely to be out of scope are declined and recorded
+# without a model call. Only first questions are judged; follow-ups go to the
+# model. bench_scope.py shows the trade-off per threshold.
+SCOPE_CLASSIFIER = os.getenv("SCOPE_CLASSIFIER", "true").lower() == "true"
+SCOPE_THRESHOLD = float(os.getenv("SCOPE_THRESHOLD", "0.8"))
+
+# Conversation history: the last HISTORY_KEEP_TURNS turns go to the model
+# verbatim (within HISTORY_TOKEN_BUDGET), older ones as a short summary.
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "6"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+
+# Request size caps for /chat*, checked before the body is parsed.
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(64 * 1024)))
+MAX_MESSAGE_CHARS = int(os.getenv("MAX_MESSAGE_CHARS", "4000"))
+MAX_HISTORY_ITEMS = int(os.getenv("MAX_HISTORY_ITEMS", "200"))
+
+# /chat/batch: up to BATCH_MAX_ITEMS questions, BATCH_CONCURRENCY at a time.
+# Callers presenting BATCH_TOKEN (Authorization: Bearer ...) are not charged
+# per question against the rate limit; everyone else pays as if the questions
+# had been sent one by one.
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_TOKEN = os.getenv("BATCH_TOKEN", "")
+# Answer the frontend's suggestion prompts once at startup so their first
+# visitors are served from the reply cache.
+WARM_CACHE_ON_START = os.getenv("WARM_CACHE_ON_START", "false").lower() == "true"
+# the frontends' suggestion chips; bench_scope.py checks its copy in test_prompts.py
+SUGGESTION_PROMPTS = [
+    "💼 Tell me about yourself",
+    "🎯 What are your skills?",
+    "📄 Send me your resume",
+    "🚀 Show me your projects",
+    "💬 How can I contact you?",
+]
+
+# Server-side conversation store (see sessions.py). SESSION_STORE is "memory"
+# or "sqlite" (persisted under STATE_DIR and shared by every worker).
+SESSION_BACKEND = os.getenv("SESSION_STORE", "memory").lower()
+
+def build_session_store():
+    options = {
+        "ttl": int(os.getenv("SESSION_TTL", "1800")),
+        "max_sessions": int(os.getenv("SESSION_MAX", "5000")),
+        "max_turns": int(os.getenv("SESSION_MAX_TURNS", "24")),
+    }
+    if SESSION_BACKEND == "sqlite":
+        return sessions.SQLiteSessionStore(STATE_DIR / "sessions.sqlite3", **options)
+    return sessions.MemorySessionStore(**options)
+
+session_store = build_session_store()
+
+# Admission control (see ratelimit.py). RATE_LIMIT_STORE is "memory" (per
+# process) or "sqlite" (limits shared by every worker on the host). Behind a
+# reverse proxy set TRUSTED_PROXY_HOPS so clients are told apart by their
+# X-Forwarded-For address rather than the proxy's.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_STORE", "memory").lower()
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+RATE_LIMITED_PATHS = {"/chat", "/chat/stream", "/chat/batch"}
+
+def build_bucket_store():
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return ratelimit.SQLiteBucketStore(STATE_DIR / "ratelimit.sqlite3")
+    return ratelimit.MemoryBucketStore()
+
+bucket_store = build_bucket_store()
+ip_limiter = ratelimit.RateLimiter(bucket_store, "ip", int(os.getenv("RATE_LIMIT_PER_MINUTE", "30")))
+session_limiter = ratelimit.RateLimiter(bucket_store, "session", int(os.getenv("SESSION_RATE_LIMIT_PER_MINUTE", "12")))
+unknown_question_limiter = ratelimit.RateLimiter(
+    bucket_store, "unknown_question", int(os.getenv("UNKNOWN_QUESTIONS_PER_HOUR", "6")), burst=3, window=3600,
+)
+# Model tokens per minute across all clients, from usage_metadata; 0 disables.
+token_budget = ratelimit.TokenBudget(bucket_store, int(os.getenv("TOKENS_PER_MINUTE", "200000")))
+
+# Reply cache in front of the model (see response_cache.py). RESPONSE_CACHE is
+# "memory" (per process), "sqlite" (shared by every worker on the host) or "off".
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE", "memory").lower()
+
+def build_response_cache():
+    if RESPONSE_CACHE_BACKEND == "off":
+        return None
+    max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+    if RESPONSE_CACHE_BACKEND == "sqlite":
+        backend = response_cache.SQLiteBackend(STATE_DIR / "response_cache.sqlite3", max_entries)
+    else:
+        backend = response_cache.MemoryBackend(max_entries)
+    return response_cache.ResponseCache(
+        backend,
+        ttl=int(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+        min_similarity=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0")),
+    )
+
+reply_cache = build_response_cache()
+
+# Concurrent identical first questions wait on one generation (see coalesce.py).
+coalescer = coalesce.SingleFlight()
+
+NON_ANSWER_REPLY = "I'm sorry — I couldn't answer that. I've recorded the question for follow-up."
+OUT_OF_SCOPE_REPLY = (
+    "That's outside the scope of my professional background, so I can't help with it here, "
+    "but I've recorded your question. Feel free to ask me about my experience, skills or projects!"
+)
+
+
+# Phrase lists used to classify messages and replies live in me/intents.json
+# and are compiled into one matcher (see intents.py):
+#   resume, linkedin, contact
+#            - visitor requests answered by canned_reply() from the fixed
+#              replies in me/canned_replies.json
+#   fallback - the model says in plain language that it will record the
+#              question or declines it as out of scope; treated as an implicit
+#              record_unknown_question call. This is a safety net for models
+#              that describe the action instead of emitting the JSON tool call.
+#   sdk_json - keys that give away raw SDK output in place of an answer
+intent_matcher = intents.IntentMatcher.from_file()
+# visitor messages are matched on whole words, so "your contact center project" isn't a contact request
+canned_replies = intents.CannedReplies.from_file(intents.IntentMatcher.from_file(whole_words=True))
+CANNED_HITS = metrics_registry.counter(
+    "canned_replies_total", "Replies served from me/canned_replies.json, by intent.", ["intent"])
+# Shown by the "linkedin" canned reply; without it those questions go to the model.
+LINKEDIN_URL = os.getenv("LINKEDIN_URL", "")
+_CONTACT_EMAIL_RE = re.compile(r"[\w.+\-]+@[\w\-]+(?:\.[\w\-]+)+")
+_CONTACT_PHONE_RE = re.compile(r"\+?\d[\d \-]{8,}\d")
+
+# Longest fallback phrase; the streaming path keeps this much tail text between
+# chunks so phrases split across chunk boundaries are still detected.
+FALLBACK_PHRASE_WINDOW = intent_matcher.longest("fallback")
+
+# Replies with fewer letters/digits than this are treated as non-answers.
+MIN_ANSWER_ALNUM = 20
+_ALNUM_RE = re.compile(r"[A-Za-z0-9]")
+
+def mentions_fallback_phrase(text):
+    return intent_matcher.matches(text, "fallback")
+
+def count_alnum(text, limit=MIN_ANSWER_ALNUM):
+    """Letters/digits in text, counting no further than `limit`."""
+    return sum(1 for _ in itertools.islice(_ALNUM_RE.finditer(text), limit))
 
 
 class Me:
@@ -275,48 +759,108 @@ class Me:
         else:
             logging.warning("✗ Resume PDF not found at: %s", self.resume_path)
         
-        pdf_path = base_dir / "me" / "linkedin.pdf"
-        self.linkedin = ""
-        if pdf_path.is_file():
-            try:
-                reader = PdfReader(str(pdf_path))
-                for page in reader.pages:
-                    text = page.extract_text()
-                    if text:
-                        self.linkedin += text
-                # sanitize any URLs from parsed LinkedIn text to avoid leaking or hallucinated links
-                if self.linkedin:
-                    self.linkedin = re.sub(r'https?://\S+','', self.linkedin)
-            except Exception as e:
-                print(f"Warning: failed to read PDF {pdf_path}: {e}", flush=True)
-        else:
-            print(f"Info: {pdf_path} not found — continuing without LinkedIn text", flush=True)
+        self.linkedin_path = base_dir / "me" / "linkedin.pdf"
+        self.summary_path = base_dir / "me" / "summary.txt"
+        self.artifact_path = profile_artifact.ARTIFACT_PATH
+        self._profile_stamp = None
+        self.refresh_profile()
 
-        summary_path = base_dir / "me" / "summary.txt"
-        if summary_path.is_file():
+    def _source_stamp(self):
+        stamp = []
+        for path in (self.linkedin_path, self.summary_path, self.resume_path):
             try:
-                with open(summary_path, "r", encoding="utf-8") as f:
-                    self.summary = f.read()
-            except Exception as e:
-                print(f"Warning: failed to read {summary_path}: {e}", flush=True)
-                self.summary = "No summary available."
-        else:
-            print(f"Info: {summary_path} not found — using default summary", flush=True)
+                stamp.append(path.stat().st_mtime_ns)
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def refresh_profile(self):
+        """(Re)load the profile documents, index and system prompt if they changed on disk."""
+        stamp = self._source_stamp()
+        if stamp == self._profile_stamp:
+            return False
+        self._profile_stamp = stamp
+        self.load_profile()
+        answerable = canned_replies.render(self.profile_facts())
+        logging.info("Canned replies for: %s", ", ".join(answerable) or "none")
+        self._system_prompt = self.build_system_prompt()
+        # Cached replies are keyed under a fingerprint of everything the model
+        # sees about the persona, so editing me/ invalidates them.
+        fingerprint = hashlib.sha256()
+        fingerprint.update(self._system_prompt.encode("utf-8"))
+        fingerprint.update(json.dumps(self.source_hashes, sort_keys=True).encode("utf-8"))
+        self.cache_namespace = fingerprint.hexdigest()[:16]
+        logging.info("System prompt built (%d chars)", len(self._system_prompt))
+        return True
+
+    def load_profile(self):
+        sources = [self.summary_path, self.linkedin_path, self.resume_path]
+        try:
+            artifact = profile_artifact.load_or_build(self.artifact_path, sources)
+        except Exception as e:
+            logging.exception("Failed to load or build the profile artifact: %s", e)
+            artifact = {"sources": {}, "index": None}
+        documents = artifact["sources"]
+
+        self.linkedin = documents.get(self.linkedin_path.name, {}).get("text", "")
+        if not self.linkedin:
+            print(f"Info: no LinkedIn text from {self.linkedin_path} — continuing without it", flush=True)
+
+        self.summary = documents.get(self.summary_path.name, {}).get("text", "")
+        if not self.summary:
+            print(f"Info: no summary text from {self.summary_path} — using default summary", flush=True)
             self.summary = "No summary available."
 
+        self.source_hashes = {name: doc.get("sha256") for name, doc in documents.items()}
+        self.index = None
+        if PROFILE_CONTEXT == "retrieval" and artifact.get("index"):
+            self.index = retrieval.BM25Index.from_dict(artifact["index"])
+        self.scope_classifier = self.load_scope_classifier(artifact) if SCOPE_CLASSIFIER else None
+
+    def load_scope_classifier(self, artifact):
+        """The artifact's scope classifier, retrained here if the examples changed since the build."""
+        stored = artifact.get("scope")
+        try:
+            if stored and stored.get("examples_sha256") == scope.examples_hash():
+                return scope.ScopeClassifier.from_dict(stored["model"], SCOPE_THRESHOLD)
+            logging.info("Training the scope classifier (none in the profile artifact for these examples)")
+            chunks = (artifact.get("index") or {}).get("chunks", [])
+            return scope.train_for_profile(chunks, threshold=SCOPE_THRESHOLD)
+        except Exception as e:
+            logging.exception("Scope classifier unavailable, every question goes to the model: %s", e)
+            return None
+
+    def profile_facts(self):
+        """Values for the {placeholders} in me/canned_replies.json; empty means unknown."""
+        email = _CONTACT_EMAIL_RE.search(self.summary)
+        phone = _CONTACT_PHONE_RE.search(self.summary)
+        return {
+            "name": self.name,
+            "email": email.group() if email else "",
+            "phone": phone.group() if phone else "",
+            "linkedin_url": LINKEDIN_URL,
+            "resume": "/resume/download" if self.resume_available else "",
+        }
+
+    def relevant_context(self, message):
+        """Top-k profile chunks for a question; opens with the summary when nothing matches."""
+        hits = [chunk for _, chunk in self.index.search(message, k=RETRIEVAL_TOP_K)]
+        if not hits:
+            hits = [c for c in self.index.chunks if c["source"] == self.summary_path.name][:RETRIEVAL_TOP_K]
+        return "\n\n".join(f"[{c['source']}] {c['text']}" for c in hits)
+
+    def build_prompt(self, message):
+        """User turn sent to the model: the question, plus retrieved excerpts in retrieval mode."""
+        if self.index is None:
+            return message
+        return f"## Relevant profile excerpts:\n{self.relevant_context(message)}\n\n## Question:\n{message}"
 
-    def handle_tool_call(self, tool_calls):
-        results = []
-        for tool_call in tool_calls:
-            tool_name = tool_call.function.name
-            arguments = json.loads(tool_call.function.arguments)
-            print(f"Tool called: {tool_name}", flush=True)
-            tool = globals().get(tool_name)
-            result = tool(**arguments) if tool else {}
-            results.append({"role": "tool","content": json.dumps(result),"tool_call_id": tool_call.id})
-        return results
-   
     def system_prompt(self):
+        """The persona system prompt, built once and rebuilt only when me/ sources change."""
+        self.refresh_profile()
+        return self._system_prompt
+
+    def build_system_prompt(self):
         system_prompt = f"You are acting as {self.name}. You are answering questions on {self.name}'s website, \
 particularly questions related to {self.name}'s career, background, skills and experience. \
 Your responsibility is to represent {self.name} for interactions on the website as faithfully as possible. \
@@ -331,51 +875,300 @@ When someone asks for your resume, CV, or professional profile, respond with:\n\
 'I'd be happy to share my resume with you! You can download it here: [RESUME_AVAILABLE]'\n\
 Replace [RESUME_AVAILABLE] with the actual link or mention that it's available for download."
         
-        system_prompt += f"\n\n## Summary:\n{self.summary}\n\n## LinkedIn Profile:\n{self.linkedin}\n\n{resume_info}\n\n"
+        if self.index is None:
+            system_prompt += f"\n\n## Summary:\n{self.summary}\n\n## LinkedIn Profile:\n{self.linkedin}\n\n{resume_info}\n\n"
+        else:
+            system_prompt += f"\n\nEach question arrives with the most relevant excerpts from {self.name}'s summary, \
+LinkedIn profile and resume; base your answer on them.\n\n{resume_info}\n\n"
         system_prompt += f"With this context, please chat with the user, always staying in character as {self.name}."
         return system_prompt
    
+    def canned_reply(self, message, turns=()):
+        """Return a fixed reply for requests we can answer without the model, else None.
+
+        The scope pre-classifier only judges first questions: a follow-up
+        ("What is it?") is about whatever came before, which it can't see.
+        """
+        # a visitor offering their own email is left to the model, which records it
+        if "@" in message:
+            return None
+        canned = canned_replies.match(message)
+        if canned is not None:
+            intent, reply = canned
+            logging.info("Canned %s reply for: %s", intent, message)
+            CANNED_HITS.inc(intent=intent)
+            REPLIES.inc(source="canned")
+            return reply
+
+        if self.scope_classifier is not None and not turns:
+            probability = self.scope_classifier.probability(message)
+            if probability >= self.scope_classifier.threshold:
+                logging.info("Pre-classifier: out of scope (p=%.2f), answering without the model", probability)
+                REPLIES.inc(source="classifier")
+                try:
+                    record_unknown_question(message)
+                except Exception as e:
+                    logging.exception("Pre-classifier record failed: %s", e)
+                return OUT_OF_SCOPE_REPLY
+        return None
+
+    def build_contents(self, message, turns):
+        """Model input: the prompt alone, or multi-turn contents when there is history."""
+        with PROMPT_BUILD_SECONDS.time():
+            prompt = self.build_prompt(message)
+            if not turns:
+                return prompt
+            return conversation.build_contents(
+                turns,
+                prompt,
+                keep_last=HISTORY_KEEP_TURNS,
+                token_budget=HISTORY_TOKEN_BUDGET,
+                summary_budget=HISTORY_SUMMARY_TOKENS,
+            )
+
+    def lookup_cached_reply(self, message, turns):
+        """Stored reply for an equivalent earlier question, or None.
+
+        Only first questions are cached; follow-ups depend on the conversation.
+        """
+        if reply_cache is None or turns:
+            return None
+        cached = reply_cache.get(message, self.cache_namespace)
+        if cached is not None:
+            REPLIES.inc(source="cache")
+        return cached
+
+    def remember_reply(self, message, reply, turns):
+        """Account for a freshly generated reply and cache it if it answers a first question."""
+        REPLIES.inc(source="model")
+        # don't pin transient failures in the cache
+        if reply_cache is not None and not turns and reply != NON_ANSWER_REPLY:
+            reply_cache.set(message, self.cache_namespace, reply)
+
     def chat(self, message, history):
-        # Check if user is asking for resume
-        lower_message = message.lower()
-        resume_keywords = ["resume", "cv", "curriculum vitae", "my resume", "my cv", "download resume", "send resume"]
-        
-        if self.resume_available and any(keyword in lower_message for keyword in resume_keywords):
-            logging.info("Resume request detected from user: %s", message)
-            
-            response_text = f"""📄 **Here's my resume!**
+        turns = conversation.normalize_history(history, message)
+        canned = self.canned_reply(message, turns)
+        if canned is not None:
+            return canned
 
-I've made it easy for you to download my complete resume. Just click the **📥 download button** in the chat header (top-right corner) to get my resume PDF instantly!
+        system_instruction = self.system_prompt()
+        cached = self.lookup_cached_reply(message, turns)
+        if cached is not None:
+            # Re-running post-processing on the stored reply repeats the
+            # unknown-question notification the original reply triggered.
+            return self.process_reply(message, cached)
 
----
+        contents = self.build_contents(message, turns)
+        model = model_router.choose(message, bool(turns))
+        response = model_router.call_sync(
+            model, lambda name: call_gemini(contents, model_name=name, system_instruction=system_instruction)
+        )
+        recorded = False
+        calls = function_calls_in(response)
+        if calls:
+            results = run_tool_calls(calls)
+            recorded = tool_succeeded(calls, results, "record_unknown_question")
+            response = call_gemini(
+                tool_follow_up(contents, calls, results),
+                model_name=model, system_instruction=system_instruction, tool_config=NO_MORE_TOOLS,
+            )
+        reply = self.finish_reply(message, response, recorded)
+        self.remember_reply(message, reply, turns)
+        return reply
 
-### 🎯 What's in my resume:
-- **Professional Experience** - My journey as an AI & Software Engineer
-- **Technical Skills** - Python, AI, Machine Learning, Full-Stack Development
-- **Projects** - Real-world applications and innovative solutions
-- **Education & Certifications** - Relevant qualifications and achievements
+    async def chat_async(self, message, history):
+        """Async variant of chat() used by the FastAPI routes.
 
----
+        The model round-trip is awaited on the event loop; everything that
+        may block runs in a worker thread: canned replies (which may record
+        the question), the profile freshness check (which may rebuild the
+        profile), the reply cache (which may be SQLite) and post-processing
+        (which may fire notification tools).
+        """
+        turns = conversation.normalize_history(history, message)
+        canned = await asyncio.to_thread(self.canned_reply, message, turns)
+        if canned is not None:
+            return canned
 
-### 💬 After reviewing, I'm here to:
-- **Discuss my experience** - Ask about specific projects or skills
-- **Answer technical questions** - Deep dive into my expertise
-- **Discuss opportunities** - Share your email if interested in collaborating
-- **Clarify anything** - I'm happy to explain any part of my background
+        system_instruction = await asyncio.to_thread(self.system_prompt)
+        cached = await asyncio.to_thread(self.lookup_cached_reply, message, turns)
+        if cached is not None:
+            return await asyncio.to_thread(self.process_reply, message, cached)
+        if turns:
+            return await self.answer_async(message, turns, system_instruction)
+        # identical first questions asked at the same time share one generation
+        return await coalescer.run(
+            self.coalesce_key(message), lambda: self.answer_async(message, turns, system_instruction)
+        )
 
-Feel free to ask any questions! 😊"""
-            
-            return response_text
-        
-        prompt = self.system_prompt() + "\n" + message
-        # Use compatibility wrapper to call Gemini across client versions
-        response = call_gemini(prompt, model_name="gemini-2.5-flash")
-        
-        # Check if response was truncated due to token limit
-        finish_reason = getattr(response, "finish_reason", None)
-        if finish_reason and "LENGTH" in str(finish_reason).upper():
-            logging.warning("Response may be truncated due to token limit. Finish reason: %s", finish_reason)
-        
+    async def chat_batch(self, messages, concurrency=BATCH_CONCURRENCY, notify=False):
+        """Answer independent first questions, `concurrency` at a time, in input order.
+
+        Messages that normalize to the same question are answered once; the
+        repeats get the same result with "duplicate": True. Each result is
+        {"message", "reply" or "error", "seconds", "duplicate"}. Answers go
+        through chat_async(), so they use and fill the reply cache. Unless
+        `notify` is set, tool calls don't send notifications.
+        """
+        limit = asyncio.Semaphore(max(1, concurrency))
+        muted = _notifications_muted.set(not notify)
+
+        async def answer(message):
+            async with limit:
+                # each item counts against MAX_INFLIGHT_CHATS like a /chat request, but waits its turn
+                await _chat_slots.acquire()
+                started = time.perf_counter()
+                try:
+                    outcome = {"reply": await self.chat_async(message, [])}
+                except Exception as e:
+                    logging.exception("Batch item failed: %s", e)
+                    outcome = {"error": type(e).__name__}
+                finally:
+                    _chat_slots.release()
+                outcome["seconds"] = round(time.perf_counter() - started, 3)
+                return outcome
+
+        keys = [self.coalesce_key(message) for message in messages]
+        tasks = {}
+        for key, message in zip(keys, messages):
+            if key not in tasks:
+                # each task runs in a copy of the current (muted) context
+                tasks[key] = asyncio.ensure_future(answer(message))
+        _notifications_muted.reset(muted)
+        if tasks:
+            await asyncio.gather(*tasks.values())
+
+        results, seen = [], set()
+        for key, message in zip(keys, messages):
+            results.append({"message": message, **tasks[key].result(), "duplicate": key in seen})
+            seen.add(key)
+        return results
+
+    def coalesce_key(self, message):
+        return self.cache_namespace, response_cache.normalize_message(message)
+
+    async def answer_async(self, message, turns, system_instruction):
+        """Generate, post-process and cache a reply (chat_async without the shortcuts)."""
+        contents = self.build_contents(message, turns)
+        model, response = await model_router.hedged(
+            model_router.choose(message, bool(turns)),
+            lambda name: call_gemini_async(contents, model_name=name, system_instruction=system_instruction),
+        )
+        recorded = False
+        calls = function_calls_in(response)
+        if calls:
+            results = await asyncio.to_thread(run_tool_calls, calls)
+            recorded = tool_succeeded(calls, results, "record_unknown_question")
+            response = await call_gemini_async(
+                tool_follow_up(contents, calls, results),
+                model_name=model, system_instruction=system_instruction, tool_config=NO_MORE_TOOLS,
+            )
+        reply = await asyncio.to_thread(self.finish_reply, message, response, recorded)
+        await asyncio.to_thread(self.remember_reply, message, reply, turns)
+        return reply
+
+    async def chat_stream(self, message, history):
+        """Stream a reply as ("delta", text) pieces followed by one ("done", reply).
+
+        Tool-call JSON is held back from the deltas, and fallback phrases are
+        detected as they arrive so the question is recorded without waiting
+        for the end of the generation. The "done" reply is the fully
+        post-processed text and is authoritative for clients.
+        """
+        turns = conversation.normalize_history(history, message)
+        canned = await asyncio.to_thread(self.canned_reply, message, turns)
+        if canned is not None:
+            yield "delta", canned
+            yield "done", canned
+            return
+
+        system_instruction = await asyncio.to_thread(self.system_prompt)
+        cached = await asyncio.to_thread(self.lookup_cached_reply, message, turns)
+        if cached is not None:
+            reply = await asyncio.to_thread(self.process_reply, message, cached)
+            yield "delta", reply
+            yield "done", reply
+            return
+
+        generate = lambda: self.answer_stream(message, turns, system_instruction)
+        # identical first questions asked at the same time share one generation
+        events = generate() if turns else coalescer.stream(self.coalesce_key(message), generate)
+        async for event in events:
+            yield event
+
+    async def answer_stream(self, message, turns, system_instruction):
+        """Generate, post-process and cache a streamed reply (chat_stream without the shortcuts)."""
+        contents = self.build_contents(message, turns)
+        scanner = tool_calls.ToolCallScanner()
+        pieces = []
+        tail = ""
+        recorded = False
+
+        # Streams are routed but not hedged: a second stream would mean
+        # retracting deltas the client has already shown. A stream that fails
+        # before its first piece is retried once on the alternate model.
+        model = model_router.choose(message, bool(turns))
+
+        async def model_pieces():
+            # the reply, plus the follow-up turn if the model called tools
+            nonlocal recorded, model
+            calls = []
+            make_stream = lambda name: call_gemini_stream(
+                contents, model_name=name, system_instruction=system_instruction, function_calls=calls
+            )
+            yielded = False
+            try:
+                async for piece in model_router.stream(model, make_stream):
+                    yielded = True
+                    yield piece
+            except Exception as e:
+                backup = model_router.alternate(model)
+                if yielded or backup is None:
+                    raise
+                logging.warning("%s failed before streaming (%s), retrying on %s", model, e, backup)
+                model = backup
+                async for piece in model_router.stream(model, make_stream):
+                    yield piece
+            if not calls:
+                return
+            results = await asyncio.to_thread(run_tool_calls, calls)
+            recorded = recorded or tool_succeeded(calls, results, "record_unknown_question")
+            async for piece in call_gemini_stream(
+                tool_follow_up(contents, calls, results),
+                model_name=model, system_instruction=system_instruction, tool_config=NO_MORE_TOOLS,
+            ):
+                yield piece
+
+        async for piece in model_pieces():
+            pieces.append(piece)
+            if not recorded:
+                window = tail + piece
+                if mentions_fallback_phrase(window):
+                    recorded = True
+                    logging.info("Detected fallback phrase in streamed response")
+                    FALLBACK_TRIGGERS.inc(path="stream")
+                    asyncio.get_running_loop().run_in_executor(
+                        None, contextvars.copy_context().run, record_unknown_question, message)
+                tail = window[-FALLBACK_PHRASE_WINDOW:]
+            visible = scanner.feed(piece)
+            if visible:
+                yield "delta", visible
+        rest = scanner.flush()
+        if rest:
+            yield "delta", rest
+
+        parsed = (scanner.text, scanner.calls)
+        reply = await asyncio.to_thread(self.process_reply, message, "".join(pieces), recorded, parsed)
+        await asyncio.to_thread(self.remember_reply, message, reply, turns)
+        yield "done", reply
+
+    def finish_reply(self, message, response, recorded=False):
+        """Extract display text from a Gemini response and run any tool side effects."""
+        # truncation (finish_reason MAX_TOKENS) is logged and counted by observe_response()
+        return self.process_reply(message, self.response_text(response), recorded)
+
+    def response_text(self, response):
+        """Pull the reply text out of a Gemini response, tolerating SDK shape differences."""
         # Try several safe extraction methods in order
         text = None
         # 1) try direct attribute access
@@ -420,26 +1213,31 @@ Feel free to ask any questions! 😊"""
                     text = str(response)
                 except Exception:
                     text = "Sorry — the model returned no text."
+        return text
 
-        # At this point we have response text (or a fallback string). Process potential tool JSON.
-        try:
-            # extract_tool_json is defined later in the module; call at runtime
-            tool_call = extract_tool_json(text)
-            if tool_call:
-                tool = tool_call.get("tool")
-                args = tool_call.get("args", {})
-                if tool in ALLOWED_TOOLS:
-                    result = ALLOWED_TOOLS[tool](**args)
-                    # remove the JSON snippet before showing to user
-                    cleaned = re.sub(r'```json[\s\S]*?```', '', text)
-                    cleaned = re.sub(r'\{\s*"tool"[\s\S]*?\}', '', cleaned)
-                    return cleaned.strip()
-        except Exception as e:
-            print(f"Warning: tool extraction/exec failed: {e}", flush=True)
+    def process_reply(self, message, text, recorded=False, parsed=None):
+        """Run tool-JSON handling and non-answer detection over the full reply text.
+
+        ``recorded`` is set by the streaming path when it already fired
+        record_unknown_question mid-stream, so the question is not recorded twice.
+        ``parsed`` is the (display_text, tool_calls) pair when the caller has
+        already scanned the reply for tool JSON, as the streaming path does.
+        """
+        # At this point we have response text (or a fallback string). Run any tool calls in it.
+        display_text, calls = parsed if parsed is not None else tool_calls.parse_tool_calls(text)
+        if calls:
+            calls = [(call.get("tool"), call.get("args") or {}) for call in calls]
+            results = run_tool_calls(calls)
+            if any(tool_succeeded(calls, results, name) for name in ALLOWED_TOOLS):
+                return display_text.strip()
+        # tool JSON is never shown to the user, even when it could not be run
+        text = display_text
 
         # Clean up the response - remove any extra metadata or tool confirmations for display
         text = (text or "").strip()
-        
+        # one scan of the reply serves both the SDK-JSON and fallback checks below
+        found = intent_matcher.classify(text)
+
         # Additional heuristic: if the model response looks like raw SDK/JSON
         # diagnostic output (e.g. contains 'candidates', 'model_version',
         # 'usage_metadata' etc.) or is very short/not human-readable, treat it
@@ -447,16 +1245,17 @@ Feel free to ask any questions! 😊"""
         try:
             stripped = text
             looks_like_sdk_json = False
-            if stripped.startswith("{") and any(k in stripped for k in ("\"candidates\"","\"model_version\"","\"usage_metadata\"","\"token_count\"","candidates","model_version")):
+            if stripped.startswith("{") and "sdk_json" in found:
                 looks_like_sdk_json = True
             # also treat extremely short or non-alphanumeric responses as non-answers
-            alpha_num_chars = len(re.findall(r"[A-Za-z0-9]", stripped))
-            if looks_like_sdk_json or alpha_num_chars < 20:
+            alpha_num_chars = count_alnum(stripped)
+            if looks_like_sdk_json or alpha_num_chars < MIN_ANSWER_ALNUM:
                 logging.warning("Detected SDK-like or malformed response: looks_like_sdk=%s alpha_chars=%d", looks_like_sdk_json, alpha_num_chars)
+                NON_ANSWERS.inc(reason="sdk_json" if looks_like_sdk_json else "too_short")
                 try:
-                    logging.info("Recording unknown question via SDK detection: %s", message)
-                    record_unknown_question(message)
-                    text = "I'm sorry — I couldn't answer that. I've recorded the question for follow-up."
+                    if not recorded:
+                        record_unknown_question(message)
+                    text = NON_ANSWER_REPLY
                     return text
                 except Exception as e:
                     logging.exception("Automatic record for SDK-like response failed: %s", e)
@@ -465,56 +1264,16 @@ Feel free to ask any questions! 😊"""
             logging.exception("SDK-like response detection failed: %s", _e)
             print(f"Warning: SDK-like response detection failed: {_e}", flush=True)
 
-        # Heuristic fallback: if the model replied in plain language that it will
-        # record or make a note (e.g. "I'll record that", "I will make a note"),
-        # treat that as an implicit record request and call `record_unknown_question`
-        # with the original user message. This is a safety net for models that
-        # describe the action instead of emitting the JSON tool call.
+        # Plain-language fallback, see the "fallback" intent
+        if recorded:
+            return text
         try:
-            lower_text = text.lower()
-            fallback_phrases = [
-                # Recording phrases
-                "i will record",
-                "i'll record",
-                "i've recorded",
-                "i have recorded",
-                "i can record",
-                "i could record",
-                "i will make a note",
-                "i'll make a note",
-                "i have made a note",
-                "i'll note",
-                "i will note",
-                "i've noted",
-                "i have noted",
-                "i will record that",
-                "recorded your question",
-                "i've recorded your",
-                "record that",
-                "record that question",
-                "i can help record",
-                "i'll help record",
-                # Out-of-scope phrases (when model politely declines)
-                "outside the scope",
-                "outside my scope",
-                "outside of my scope",
-                "not related to my professional",
-                "not related to my background",
-                "not my area of expertise",
-                "outside of my expertise",
-                "that question is outside",
-                "that's outside the scope",
-                "i'm afraid that's",
-                "i'm sorry, that question is outside",
-                "outside of my knowledge",
-                "not something i can",
-                "not something i'm able to",
-            ]
-            if any(p in lower_text for p in fallback_phrases):
-                logging.info("Detected fallback phrase in response, calling record_unknown_question for: %s", message)
+            if "fallback" in found:
+                logging.info("Detected fallback phrase in response")
+                FALLBACK_TRIGGERS.inc(path="reply")
                 try:
                     result = record_unknown_question(message)
-                    logging.info("Fallback record result: %s", result)
+                    logging.debug("Fallback record result: %s", result)
                 except Exception as e:
                     logging.exception("Fallback record failed: %s", e)
                     print(f"Warning: fallback record failed: {e}", flush=True)
@@ -530,25 +1289,217 @@ ALLOWED_TOOLS = {
   "record_unknown_question": record_unknown_question,
 }
 
-def extract_tool_json(text):
-    # naive: find first {...} JSON block that contains "tool"
-    m = re.search(r'(\{\s*"tool"[\s\S]*?\})', text)
-    if not m:
-        # also try code-fence JSON
-        m = re.search(r'```json\s*(\{[\s\S]*?\})\s*```', text)
-    if not m:
-        return None
+def run_tool_calls(calls):
+    """Run (name, args) tool calls concurrently and return their results in order.
+
+    Each call is bounded by its TOOL_TIMEOUTS entry; one that overruns or
+    fails is reported as {"error": ...} and a late tool keeps running in the
+    background, so a slow notifier never holds up the reply.
+    """
+    started = time.monotonic()
+    futures = []
+    for name, args in calls:
+        if name in ALLOWED_TOOLS and isinstance(args, dict):
+            logging.info("Tool called: %s", name)
+            # copy the context so the tool's log lines keep the request id
+            futures.append(tool_executor.submit(contextvars.copy_context().run, timed_tool, name, args))
+        else:
+            logging.warning("Ignoring tool call %r with args %r", name, args)
+            futures.append(None)
+    results = []
+    for (name, _), future in zip(calls, futures):
+        if future is None:
+            results.append({"error": f"unknown tool {name}"})
+            continue
+        timeout = TOOL_TIMEOUTS.get(name, TOOL_TIMEOUT)
+        try:
+            results.append(future.result(timeout=max(0.0, started + timeout - time.monotonic())))
+        except concurrent.futures.TimeoutError:
+            logging.warning("Tool %s did not finish within %.1fs", name, timeout)
+            results.append({"error": "timed out"})
+        except Exception as e:
+            logging.exception("Tool %s failed: %s", name, e)
+            results.append({"error": str(e)})
+    return results
+
+def timed_tool(name, args):
+    with TOOL_SECONDS.time(tool=name):
+        return ALLOWED_TOOLS[name](**args)
+
+def tool_succeeded(calls, results, name):
+    return any(n == name and "error" not in result for (n, _), result in zip(calls, results))
+
+def function_calls_in(response):
+    """(name, args) for every function_call part in a Gemini response or stream chunk."""
+    calls = []
     try:
-        return json.loads(m.group(1))
+        candidates = response.candidates or []
     except Exception:
-        return None
+        return calls
+    for candidate in candidates:
+        content = getattr(candidate, "content", None)
+        for part in getattr(content, "parts", None) or []:
+            call = getattr(part, "function_call", None)
+            if call and call.name:
+                calls.append((call.name, dict(call.args)))
+    return calls
+
+def tool_follow_up(contents, calls, results):
+    """Contents for the single follow-up turn: the conversation, the model's calls and their results."""
+    if isinstance(contents, str):
+        contents = [{"role": conversation.USER, "parts": [contents]}]
+    return list(contents) + [
+        {"role": conversation.MODEL, "parts": [
+            genai.protos.Part(function_call=genai.protos.FunctionCall(name=name, args=args))
+            for name, args in calls
+        ]},
+        {"role": conversation.USER, "parts": [
+            genai.protos.Part(function_response=genai.protos.FunctionResponse(name=name, response={"result": result}))
+            for (name, _), result in zip(calls, results)
+        ]},
+    ]
 
 
 # ========== SETUP FASTAPI ==========
+# Loaded at import, so a pre-forking server (gunicorn.conf.py) parses the
+# profile once and its workers share it copy-on-write.
 me = Me()
+model_registry.warm(me.system_prompt())
+
+async def warm_reply_cache(prompts=SUGGESTION_PROMPTS):
+    lock = None
+    if fcntl is not None and RESPONSE_CACHE_BACKEND == "sqlite":
+        # the cache is shared, so only the first worker to start needs to do this
+        STATE_DIR.mkdir(parents=True, exist_ok=True)
+        lock = open(STATE_DIR / ".warm.lock", "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            logging.info("Reply cache is being warmed by another worker")
+            return
+    try:
+        started = time.perf_counter()
+        results = await me.chat_batch(prompts)
+        failed = sum(1 for result in results if "error" in result)
+        logging.info("Warmed reply cache with %d prompts in %.2fs (%d failed)",
+                     len(results), time.perf_counter() - started, failed)
+    finally:
+        if lock is not None:
+            lock.close()
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Threads don't survive fork(), so they start here, in each serving process.
+    if notifications_configured():
+        # start now so notifications spooled before a restart go out right away
+        dispatcher.start()
+    # off the startup path: until it finishes the router trusts the configured models
+    threading.Thread(
+        target=model_router.discover, args=(get_available_models, MODEL_LIST_CACHE),
+        name="model-discovery", daemon=True,
+    ).start()
+    warming = asyncio.create_task(warm_reply_cache()) if WARM_CACHE_ON_START and reply_cache is not None else None
+    yield
+    if warming is not None:
+        warming.cancel()
+
+app = FastAPI(title="Priyanshu AI Backend", lifespan=lifespan)
 
-app = FastAPI(title="Priyanshu AI Backend")
+# gzip (or brotli, if installed) for HTML/JSON/JS/CSS; SSE streams pass through
+if os.getenv("COMPRESS_RESPONSES", "true").lower() == "true":
+    app.add_middleware(http_cache.CompressionMiddleware, minimum_size=int(os.getenv("COMPRESS_MIN_BYTES", "1024")))
 
+# /resume/download and the frontend are revalidated with their ETag after this long
+RESUME_MAX_AGE = int(os.getenv("RESUME_MAX_AGE", str(7 * 86400)))
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "3600"))
+
+def rate_limited(detail, wait):
+    return JSONResponse({"detail": detail}, status_code=429, headers={"Retry-After": ratelimit.retry_after_header(wait)})
+
+@app.middleware("http")
+async def admit_chat_requests(request: Request, call_next):
+    """Turn away over-limit clients, and everyone while over the token budget, before the body is read."""
+    if request.method != "POST" or request.url.path not in RATE_LIMITED_PATHS:
+        return await call_next(request)
+    client = ratelimit.client_ip(
+        request.client.host if request.client else None, request.headers.get("x-forwarded-for"), TRUSTED_PROXY_HOPS,
+    )
+    ratelimit.bind_client(client)
+    # the bucket store may be SQLite, so it is consulted off the event loop
+    wait = await asyncio.to_thread(ip_limiter.check, client)
+    if wait:
+        RATE_LIMITED.inc(scope="ip")
+        logging.warning("Rate limited client %s for %.1fs", client, wait)
+        return rate_limited("Too many messages, please slow down.", wait)
+    wait = await asyncio.to_thread(token_budget.retry_after)
+    if wait:
+        RATE_LIMITED.inc(scope="token_budget")
+        logging.warning("Token budget exhausted; rejecting for %.1fs", wait)
+        return rate_limited("The assistant is very busy right now, please retry shortly.", wait)
+    return await call_next(request)
+
+_REQUEST_ID_RE = re.compile(r"[\w\-]{1,64}")
+
+@app.middleware("http")
+async def bind_request_id(request: Request, call_next):
+    """Tag the request's log lines with X-Request-ID (or a fresh id) and echo it back."""
+    header = request.headers.get("x-request-id", "")
+    request_id = logs.bind_request(header if _REQUEST_ID_RE.fullmatch(header) else None)
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+class LimitRequestBody:
+    """413 for bodies over `max_bytes`, before anything parses them.
+
+    A body with a Content-Length is judged by it; a chunked one is read here,
+    up to the limit, and replayed to the app.
+    """
+
+    def __init__(self, app, max_bytes):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        too_large = JSONResponse({"detail": "Request body too large"}, status_code=413)
+        length = Headers(scope=scope).get("content-length")
+        if length is not None:
+            if length.isdigit() and int(length) > self.max_bytes:
+                await too_large(scope, receive, send)
+                return
+            await self.app(scope, receive, send)
+            return
+
+        chunks, size, more_body = [], 0, True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                return  # client went away
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_bytes:
+                await too_large(scope, receive, send)
+                return
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            replayed = True
+            return {"type": "http.request", "body": b"".join(chunks), "more_body": False}
+
+        await self.app(scope, replay, send)
+
+app.add_middleware(LimitRequestBody, max_bytes=MAX_REQUEST_BYTES)
+
+# added last so it is the outermost layer: the 413s and 429s above carry CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -559,51 +1510,316 @@ app.add_middleware(
 # Serve static files (frontend HTML)
 frontend_path = Path(__file__).resolve().parent.parent / "frontend"
 if frontend_path.exists():
-    app.mount("/frontend", StaticFiles(directory=str(frontend_path)), name="frontend")
+    app.mount(
+        "/frontend",
+        http_cache.CachedStaticFiles(directory=str(frontend_path), max_age=STATIC_MAX_AGE),
+        name="frontend",
+    )
 
 class ChatRequest(BaseModel):
-    message: str
-    history: list = []
+    message: str = Field(..., max_length=MAX_MESSAGE_CHARS)
+    # Clients that pass session_id only need to send the new message; history
+    # seeds a new session, for older clients and for the retry after a 409
+    # session_reset (see resolve_session).
+    session_id: Optional[str] = Field(None, max_length=64)
+    history: list = Field(default_factory=list, max_length=MAX_HISTORY_ITEMS)
 
 class ChatResponse(BaseModel):
     reply: str
+    session_id: Optional[str] = None
+
+class SessionExpired(Exception):
+    """The request names a session the store no longer has, and sent no history to rebuild it from."""
+
+@app.exception_handler(SessionExpired)
+async def session_expired(request: Request, exc: SessionExpired):
+    # answering now would mean answering a follow-up without its context; the
+    # client retries once without the session_id and with its copy of the history
+    return JSONResponse(
+        {"detail": "This conversation has expired, please resend it with its history.", "session_reset": True},
+        status_code=409,
+    )
+
+def resolve_session(req):
+    """Return (session_id, history) for a request.
+
+    Turns stored for a live session win over client-sent history. An
+    unknown or expired session (or none) gets a fresh server-issued id,
+    seeded from whatever history the client sent; if it sent none, the
+    request is refused with SessionExpired rather than answered out of
+    context.
+    """
+    history = session_store.get(req.session_id) if req.session_id else None
+    if history is not None:
+        return req.session_id, history
+    if req.session_id and not req.history:
+        logging.info("Session %s expired or unknown; asking the client for its history", req.session_id)
+        raise SessionExpired()
+    session_id = sessions.new_session_id()
+    seed = conversation.normalize_history(req.history, req.message)
+    if seed:
+        session_store.append(session_id, seed)
+    return session_id, [{"role": role, "text": text} for role, text in seed]
+
+def record_turn(session_id, message, reply):
+    session_store.append(session_id, [(conversation.USER, message), (conversation.MODEL, reply)])
 
 @app.get("/api")
 def api_status():
     return {"message": "Priyanshu AI Backend is running!", "version": "1.0"}
 
+# Counts kept by other components, read at scrape time.
+metrics_registry.callback(
+    "reply_cache_lookups_total", "Reply cache lookups by result.",
+    lambda: {} if reply_cache is None else {
+        ("hit",): reply_cache.hits, ("similar_hit",): reply_cache.similar_hits, ("miss",): reply_cache.misses,
+    },
+    kind="counter", labels=["result"],
+)
+metrics_registry.callback(
+    "coalesced_requests_total", "Requests that shared an in-flight generation instead of calling the model.",
+    lambda: coalescer.coalesced, kind="counter",
+)
+metrics_registry.callback(
+    "hedged_requests_total", "Hedged model calls started, and how many the backup model won.",
+    lambda: {(k,): v for k, v in model_router.hedges.items()}, kind="counter", labels=["outcome"],
+)
+metrics_registry.callback(
+    "notifications_total", "Notifications by final outcome.",
+    lambda: {(k,): dispatcher.stats()[k] for k in ("sent", "failed")}, kind="counter", labels=["outcome"],
+)
+metrics_registry.callback(
+    "notifications_coalesced_total",
+    "Notifications delivered inside a combined message (also counted as sent in notifications_total).",
+    lambda: dispatcher.stats()["coalesced"], kind="counter",
+)
+metrics_registry.callback(
+    "notifications_pending", "Notifications queued or waiting for a retry.", lambda: dispatcher.stats()["pending"],
+)
+metrics_registry.callback(
+    "chat_slots_in_use", "Chat requests currently holding a model slot.",
+    lambda: _chat_slots.in_use,
+)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/router/stats")
+def router_stats():
+    return model_router.stats()
+
+@app.get("/cache/stats")
+def cache_stats():
+    if reply_cache is None:
+        return {"enabled": False, "coalescing": coalescer.stats()}
+    return {"enabled": True, "backend": RESPONSE_CACHE_BACKEND, **reply_cache.stats(), "coalescing": coalescer.stats()}
+
 @app.get("/health")
 @app.head("/health")
 def health():
     return {"status": "ok"}
 
+class ChatSlots:
+    """At most `size` chat requests talking to the model at once."""
+
+    def __init__(self, size):
+        self._semaphore = asyncio.Semaphore(size)
+        self.in_use = 0
+
+    async def acquire(self, timeout=None):
+        await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+        self.in_use += 1
+
+    def release(self):
+        self.in_use -= 1
+        self._semaphore.release()
+
+_chat_slots = ChatSlots(MAX_INFLIGHT_CHATS)
+
+async def check_session_rate(session_id):
+    wait = await asyncio.to_thread(session_limiter.check, session_id)
+    if wait:
+        RATE_LIMITED.inc(scope="session")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many messages in this conversation, please slow down.",
+            headers={"Retry-After": ratelimit.retry_after_header(wait)},
+        )
+
+async def acquire_chat_slot():
+    """Wait briefly for an in-flight slot; reject with 429 + Retry-After when saturated."""
+    try:
+        await _chat_slots.acquire(timeout=CHAT_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logging.warning("Chat capacity exhausted (%d in flight); rejecting request", MAX_INFLIGHT_CHATS)
+        raise HTTPException(
+            status_code=429,
+            detail="Too many conversations right now, please retry shortly.",
+            headers={"Retry-After": str(CHAT_RETRY_AFTER)},
+        )
+
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    reply = me.chat(req.message, req.history)
-    return {"reply": reply}
+async def chat(req: ChatRequest):
+    with CHAT_SECONDS.time(route="/chat"):
+        await check_session_rate(req.session_id)
+        session_id, history = await asyncio.to_thread(resolve_session, req)
+        await acquire_chat_slot()
+        try:
+            reply = await me.chat_async(req.message, history)
+        finally:
+            _chat_slots.release()
+        await asyncio.to_thread(record_turn, session_id, req.message, reply)
+    return {"reply": reply, "session_id": session_id}
+
+class BatchRequest(BaseModel):
+    messages: List[Annotated[str, Field(max_length=MAX_MESSAGE_CHARS)]] = Field(
+        ..., min_length=1, max_length=BATCH_MAX_ITEMS,
+    )
+    concurrency: Optional[int] = Field(None, ge=1, le=BATCH_CONCURRENCY)
+    notify: bool = False
+
+def charge_batch(questions, authorization):
+    """Charge a batch's extra questions to the caller's rate limit, unless it holds BATCH_TOKEN."""
+    if BATCH_TOKEN and hmac.compare_digest(authorization or "", f"Bearer {BATCH_TOKEN}"):
+        return
+    if ip_limiter.enabled and questions > ip_limiter.capacity:
+        raise HTTPException(status_code=413, detail=f"At most {int(ip_limiter.capacity)} questions per batch")
+    # the admission middleware already took one
+    wait = ip_limiter.check(ratelimit.current_client(), cost=questions - 1)
+    if wait:
+        RATE_LIMITED.inc(scope="ip")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many messages, please slow down.",
+            headers={"Retry-After": ratelimit.retry_after_header(wait)},
+        )
+
+@app.post("/chat/batch")
+async def chat_batch(req: BatchRequest, authorization: Optional[str] = Header(None)):
+    """Answer a list of independent first questions (no sessions), e.g. for evaluation or cache warming."""
+    started = time.perf_counter()
+    questions = len({me.coalesce_key(message) for message in req.messages})
+    await asyncio.to_thread(charge_batch, questions, authorization)
+    results = await me.chat_batch(req.messages, concurrency=req.concurrency or BATCH_CONCURRENCY, notify=req.notify)
+    elapsed = time.perf_counter() - started
+    CHAT_SECONDS.observe(elapsed, route="/chat/batch")
+    return {"results": results, "unique": questions, "seconds": round(elapsed, 3)}
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Stream the reply as Server-Sent Events: `delta` pieces, then one `done`."""
+    started = time.perf_counter()
+    await check_session_rate(req.session_id)
+    # before the response starts, so an expired session can still be refused with a 409
+    session_id, history = await asyncio.to_thread(resolve_session, req)
+    await acquire_chat_slot()
+
+    async def events():
+        try:
+            async for kind, text in me.chat_stream(req.message, history):
+                if kind == "delta":
+                    yield sse_event("delta", {"text": text})
+                else:
+                    await asyncio.to_thread(record_turn, session_id, req.message, text)
+                    yield sse_event("done", {"reply": text, "session_id": session_id})
+        except Exception as e:
+            logging.exception("Streaming chat failed: %s", e)
+            yield sse_event("error", {"detail": "Sorry, I encountered an error. Please try again."})
+        finally:
+            _chat_slots.release()
+            CHAT_SECONDS.observe(time.perf_counter() - started, route="/chat/stream")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/resume")
 def resume_info():
     if me.resume_available:
         return {
             "available": True,
-            "path": str(me.resume_path)
+            "url": "/resume/download"
         }
     return {"available": False}
 
+@app.get("/resume/download")
+def resume_download(request: Request):
+    """The resume PDF, with validators and Range support so repeat and resumed downloads are cheap."""
+    if not me.resume_path.is_file():
+        raise HTTPException(status_code=404, detail="Resume not available")
+    return http_cache.file_response(
+        request,
+        me.resume_path,
+        media_type="application/pdf",
+        cache_control=f"public, max-age={RESUME_MAX_AGE}",
+        filename=me.resume_path.name,
+    )
+
 @app.get("/")
-def serve_frontend():
+def serve_frontend(request: Request):
     """Serve the frontend HTML"""
-    frontend_path = Path(__file__).resolve().parent.parent / "frontend" / "index.html"
-    if frontend_path.exists():
-        return FileResponse(str(frontend_path), media_type="text/html")
+    index_path = frontend_path / "index.html"
+    if index_path.exists():
+        # the page URL is not versioned, so browsers revalidate (a 304) on every visit
+        return http_cache.file_response(request, index_path, media_type="text/html; charset=utf-8", cache_control="no-cache")
     return {"error": "Frontend not found"}
 
 
+def batch_main(argv):
+    """`python -m app batch`: answer questions through Me.chat_batch and print the results."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m app batch", description=batch_main.__doc__)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--file", help="questions, one per line ('-' for stdin)")
+    source.add_argument("--suggestions", action="store_true", help="the frontend suggestion prompts (warms the cache)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--notify", action="store_true", help="let tool calls send notifications")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.file:
+        with (sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")) as f:
+            messages = [line.strip() for line in f if line.strip()]
+    elif args.suggestions:
+        messages = SUGGESTION_PROMPTS
+    else:
+        from test_prompts import TEST_PROMPTS
+        messages = TEST_PROMPTS
+
+    started = time.perf_counter()
+    results = asyncio.run(me.chat_batch(messages, concurrency=args.concurrency, notify=args.notify))
+    elapsed = time.perf_counter() - started
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for result in results:
+            answer = result.get("reply", f"<{result.get('error')}>").replace("\n", " ")
+            flag = " (dup)" if result["duplicate"] else ""
+            print(f"{result['seconds']:7.2f}s{flag:6} {result['message'][:40]:40}  {answer[:70]}")
+    failed = sum(1 for result in results if "error" in result)
+    print(f"{len(results)} messages, {len({me.coalesce_key(m) for m in messages})} unique, "
+          f"{failed} failed, {elapsed:.2f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["batch"]:
+    sys.exit(batch_main(sys.argv[2:]))
+
 if __name__ == "__main__":
     RUN_GRADIO = os.getenv("RUN_GRADIO", "false").lower() == "true"
     
     if RUN_GRADIO:
+        # Gradio is heavy and only needed for this UI, so it is imported here
+        # rather than at module level (the uvicorn deployment never loads it).
+        import gradio as gr
+
         # Launch Gradio UI
         port = int(os.getenv("PORT", 7860))
         
@@ -681,7 +1897,8 @@ if __name__ == "__main__":
                 # Last resort: plain launch
                 gr.ChatInterface(me.chat).launch()
     else:
-        # Launch FastAPI (default)
+        # Launch FastAPI (default): one process. For several workers sharing the
+        # preloaded profile, run `gunicorn -c gunicorn.conf.py` instead.
         import uvicorn
-        uvicorn.run(app, host="0.0.0.0", port=8000)
+        uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
 
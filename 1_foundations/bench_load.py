@@ -0,0 +1,517 @@
+"""
+Offline load test for the FastAPI app.
+
+Replays TEST_PROMPTS from test_prompts.py, plus synthetic multi-turn
+sessions, against the app served by uvicorn on a local port, at a
+configurable concurrency. Nothing leaves the machine:
+
+- Gemini is replaced by FakeGemini, which mimics generate_content latency,
+  time to first token and streaming, and answers out-of-scope prompts the
+  ways the real model does (fallback phrase, inline tool JSON, native
+  function call, an SDK-JSON dump, a too-short reply).
+- Telegram is served by a local stub HTTP server (TELEGRAM_API_URL points at
+  it), so notifications go through the real dispatcher and push() over HTTP.
+
+Reports throughput, latency percentiles per route, time to first streamed
+token, how many replies the scope pre-classifier answered without the
+model, and classification accuracy: whether each prompt's question reached
+the stub notifier (recorded) or not, against IN_SCOPE_PROMPTS.
+
+Usage:
+    python bench_load.py                                  # 200 requests, concurrency 8
+    python bench_load.py --requests 1000 --concurrency 32 --stream 0.5
+    python bench_load.py --latency-ms 800 --notify-fail 0.2
+    python bench_load.py --min-accuracy 1.0 --max-p95-ms 2000   # exit 1 on regression
+    python bench_load.py --json                           # machine-readable summary for CI logs
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import google.generativeai as genai
+
+from router import percentile
+from test_prompts import IN_SCOPE_PROMPTS, TEST_PROMPTS
+
+# How the fake model answers an out-of-scope prompt; rotated over the prompts
+# so every detection path in process_reply() and the tool plumbing is hit.
+OUT_OF_SCOPE_STYLES = ("fallback", "inline_tool", "native_tool", "sdk_json")
+
+SESSION_TURNS = (
+    "Tell me about your background",
+    "Which of those projects used Python?",
+    "Can you go into more detail on the last one?",
+)
+
+REPLIES = {
+    "answer": (
+        "I have spent the last few years building production AI systems in Python: retrieval "
+        "pipelines, FastAPI backends and evaluation tooling for LLM applications, including a "
+        "ranking service that shortlists candidates for recruiters."
+    ),
+    "fallback": "That's outside the scope of my professional background, so I'll record your question and follow up.",
+    "sdk_json": '{"candidates": [{"content": {"parts": []}, "finish_reason": 1}], "usage_metadata": {"prompt_token_count": 12}}',
+    "too_short": "Hmm?",
+    "after_tool": "Good question! It's outside my professional background, but I've passed it on and will get back to you.",
+}
+
+
+# ---------- fake Gemini ----------
+
+class FakeSettings:
+    latency = 0.3      # seconds for a whole generation
+    jitter = 0.5       # +/- fraction of latency
+    ttft = 0.1         # seconds before the first streamed chunk
+    chunk_chars = 24
+    styles = {}        # question -> reply style; anything else gets "answer"
+    calls = 0
+
+
+def fake_latency():
+    return max(0.0, FakeSettings.latency * (1 + random.uniform(-FakeSettings.jitter, FakeSettings.jitter)))
+
+
+def _is_function_response(part):
+    return isinstance(part, genai.protos.Part) and "function_response" in part
+
+
+def question_of(contents):
+    """The visitor's question in the model input, or None for a tool follow-up turn."""
+    if isinstance(contents, str):
+        text = contents
+    else:
+        text = ""
+        for turn in reversed(contents):
+            role = turn.get("role") if isinstance(turn, dict) else getattr(turn, "role", None)
+            if role != "user":
+                continue
+            parts = turn.get("parts") if isinstance(turn, dict) else getattr(turn, "parts", [])
+            if any(_is_function_response(part) for part in parts):
+                return None
+            text = "".join(part for part in parts if isinstance(part, str))
+            break
+    # build_prompt() puts retrieved excerpts first and the question last
+    return text.rsplit("## Question:\n", 1)[-1].strip()
+
+
+class FakeResponse:
+    """The parts of a GenerateContentResponse that app.py reads."""
+
+    def __init__(self, text="", calls=(), last=True):
+        self._text = text
+        parts = [SimpleNamespace(text=text, function_call=None)] if text else []
+        parts += [
+            SimpleNamespace(text="", function_call=genai.protos.FunctionCall(name=name, args=args))
+            for name, args in calls
+        ]
+        finish = SimpleNamespace(name="STOP") if last else None
+        self.candidates = [SimpleNamespace(content=SimpleNamespace(parts=parts), finish_reason=finish)]
+        words = len(text.split())
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=400, candidates_token_count=words, cached_content_token_count=0,
+            total_token_count=400 + words,
+        ) if last else None
+
+    @property
+    def text(self):
+        if not self._text:
+            raise ValueError("response has no text parts")
+        return self._text
+
+
+class FakeGemini:
+    """Stands in for genai.GenerativeModel."""
+
+    def __init__(self, model_name="gemini", generation_config=None, system_instruction=None, tools=None, **kwargs):
+        self.model_name = model_name
+        self.native_tools = bool(tools)
+
+    def _reply(self, contents, kwargs):
+        FakeSettings.calls += 1
+        question = question_of(contents)
+        if question is None:
+            return REPLIES["after_tool"], ()
+        style = FakeSettings.styles.get(question, "answer")
+        native_allowed = self.native_tools and kwargs.get("tool_config") is None
+        if style == "native_tool" and not native_allowed:
+            style = "inline_tool"
+        if style == "native_tool":
+            return "", [("record_unknown_question", {"question": question})]
+        if style == "inline_tool":
+            call = json.dumps({"tool": "record_unknown_question", "args": {"question": question}})
+            return f"Let me note that one down.\n{call}", ()
+        return REPLIES[style], ()
+
+    def generate_content(self, contents, **kwargs):
+        text, calls = self._reply(contents, kwargs)
+        time.sleep(fake_latency())
+        return FakeResponse(text, calls)
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        text, calls = self._reply(contents, kwargs)
+        latency = fake_latency()
+        if not stream:
+            await asyncio.sleep(latency)
+            return FakeResponse(text, calls)
+        return self._stream(text, calls, latency)
+
+    async def _stream(self, text, calls, latency):
+        ttft = min(FakeSettings.ttft, latency)
+        await asyncio.sleep(ttft)
+        if calls:
+            yield FakeResponse(calls=calls)
+            return
+        chunks = [text[i:i + FakeSettings.chunk_chars] for i in range(0, len(text), FakeSettings.chunk_chars)]
+        pause = (latency - ttft) / max(1, len(chunks) - 1)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(pause)
+            yield FakeResponse(chunk, last=i == len(chunks) - 1)
+
+
+def fake_list_models():
+    return [
+        SimpleNamespace(name=f"models/{name}", supported_generation_methods=["generateContent"])
+        for name in ("gemini-2.5-flash", "gemini-2.5-flash-lite")
+    ]
+
+
+# ---------- stub Telegram / Pushover ----------
+
+class StubNotifier(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.05, fail_rate=0.0):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.messages = []
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def recorded_questions(self):
+        """Questions named in the delivered messages (see NotificationDispatcher._format)."""
+        questions = set()
+        with self.lock:
+            messages = list(self.messages)
+        for message in messages:
+            head, _, rest = message.partition("\n")
+            if head.startswith("Recording unknown question: "):
+                questions.add(head[len("Recording unknown question: "):].strip())
+            elif rest:
+                questions.update(line[2:].strip() for line in rest.splitlines() if line.startswith("- "))
+        return questions
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+        if "json" in (self.headers.get("Content-Type") or ""):
+            payload = json.loads(body or "{}")
+        else:
+            payload = {k: v[0] for k, v in urllib.parse.parse_qs(body).items()}
+        time.sleep(self.server.latency)
+        if random.random() < self.server.fail_rate:
+            with self.server.lock:
+                self.server.failures += 1
+            self._reply(500, {"ok": False, "description": "stub failure"})
+            return
+        with self.server.lock:
+            # Telegram sends "text", Pushover "message"
+            self.server.messages.append(payload.get("text") or payload.get("message") or "")
+        self._reply(200, {"ok": True, "status": 1})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# ---------- load generator ----------
+
+def build_jobs(total, session_share, rng):
+    """Jobs of one or more messages; the messages of a job share a session."""
+    jobs = []
+    count = 0
+    prompts = list(TEST_PROMPTS)
+    while count < total:
+        if rng.random() < session_share:
+            job = list(SESSION_TURNS)
+        else:
+            if not prompts:
+                prompts = list(TEST_PROMPTS)
+            job = [prompts.pop(rng.randrange(len(prompts)))]
+        jobs.append(job[:total - count])
+        count += len(jobs[-1])
+    return jobs
+
+
+async def send_chat(client, message, session_id):
+    payload = {"message": message, "session_id": session_id} if session_id else {"message": message}
+    started = time.perf_counter()
+    r = await client.post("/chat", json=payload)
+    sample = {"route": "/chat", "status": r.status_code, "seconds": time.perf_counter() - started}
+    return sample, r.json().get("session_id") if r.status_code == 200 else None
+
+
+async def send_stream(client, message, session_id):
+    payload = {"message": message, "session_id": session_id} if session_id else {"message": message}
+    started = time.perf_counter()
+    sample = {"route": "/chat/stream", "ttft": None}
+    event = None
+    async with client.stream("POST", "/chat/stream", json=payload) as r:
+        sample["status"] = r.status_code
+        async for line in r.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "delta" and sample["ttft"] is None:
+                    sample["ttft"] = time.perf_counter() - started
+                elif event == "done":
+                    session_id = data.get("session_id")
+                elif event == "error":
+                    sample["status"] = 500
+    sample["seconds"] = time.perf_counter() - started
+    return sample, session_id
+
+
+def start_server(app):
+    """Serve `app` with uvicorn on a free local port from a background thread."""
+    import uvicorn
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", access_log=False))
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, name="uvicorn", daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+async def run_load(base_url, jobs, concurrency, stream_share, rng):
+    import httpx
+
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    samples = []
+
+    async def worker(client):
+        while True:
+            try:
+                job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            session_id = None
+            for message in job:
+                send = send_stream if rng.random() < stream_share else send_chat
+                try:
+                    sample, session_id = await send(client, message, session_id)
+                except Exception as e:
+                    sample = {"route": "error", "status": 0, "seconds": 0.0, "error": repr(e)}
+                samples.append(sample)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+def wait_for_notifications(dispatcher, stub, settle, timeout=30.0):
+    """Block until the dispatcher queue is empty and the stub has been quiet for `settle` seconds."""
+    deadline = time.monotonic() + timeout
+    seen, quiet_since = -1, time.monotonic()
+    while time.monotonic() < deadline:
+        count = len(stub.messages)
+        if count != seen or dispatcher.pending():
+            seen, quiet_since = count, time.monotonic()
+        elif time.monotonic() - quiet_since >= settle:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def latency_summary(values):
+    values = sorted(values)
+    if not values:
+        return None
+    ms = lambda q: round(percentile(values, q) * 1000, 1)
+    return {
+        "mean_ms": round(sum(values) / len(values) * 1000, 1),
+        "p50_ms": ms(0.5), "p90_ms": ms(0.9), "p95_ms": ms(0.95), "p99_ms": ms(0.99),
+        "max_ms": round(values[-1] * 1000, 1),
+    }
+
+
+def classification(asked, recorded):
+    tp = sorted(q for q in asked if q not in IN_SCOPE_PROMPTS and q in recorded)
+    fn = sorted(q for q in asked if q not in IN_SCOPE_PROMPTS and q not in recorded)
+    fp = sorted(q for q in asked if q in IN_SCOPE_PROMPTS and q in recorded)
+    tn = sorted(q for q in asked if q in IN_SCOPE_PROMPTS and q not in recorded)
+    return {
+        "prompts": len(asked),
+        "accuracy": round((len(tp) + len(tn)) / len(asked), 4) if asked else None,
+        "true_positive": len(tp), "true_negative": len(tn),
+        "false_positive": fp, "false_negative": fn,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stream", type=float, default=0.3, help="share of requests sent to /chat/stream")
+    parser.add_argument("--sessions", type=float, default=0.2, help="share of jobs that are multi-turn sessions")
+    parser.add_argument("--latency-ms", type=float, default=300, help="fake Gemini generation time")
+    parser.add_argument("--jitter", type=float, default=0.5, help="+/- fraction of --latency-ms")
+    parser.add_argument("--ttft-ms", type=float, default=100, help="fake Gemini time to first streamed chunk")
+    parser.add_argument("--notify-latency-ms", type=float, default=50)
+    parser.add_argument("--notify-fail", type=float, default=0.0, help="share of stub notifier requests that fail")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--min-accuracy", type=float, default=None, help="fail if classification accuracy is lower")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="fail if /chat p95 latency is higher")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's INFO logging")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    FakeSettings.latency = args.latency_ms / 1000
+    FakeSettings.jitter = args.jitter
+    FakeSettings.ttft = args.ttft_ms / 1000
+    out_of_scope = [p for p in TEST_PROMPTS if p not in IN_SCOPE_PROMPTS]
+    FakeSettings.styles = {
+        prompt: "too_short" if len(prompt) < 8 else OUT_OF_SCOPE_STYLES[i % len(OUT_OF_SCOPE_STYLES)]
+        for i, prompt in enumerate(out_of_scope)
+    }
+
+    stub = StubNotifier(latency=args.notify_latency_ms / 1000, fail_rate=args.notify_fail)
+    threading.Thread(target=stub.serve_forever, name="stub-notifier", daemon=True).start()
+
+    state_dir = tempfile.mkdtemp(prefix="bench-load-")
+    os.environ.update({
+        # importing app requires a key; every model call goes to FakeGemini
+        "GEMINI_API_KEY": "benchmark-placeholder",
+        "STATE_DIR": state_dir,
+        "TELEGRAM_BOT_TOKEN": "bench",
+        "TELEGRAM_CHAT_ID": "bench",
+        "TELEGRAM_API_URL": stub.url,
+        "NOTIFY_BACKOFF_BASE": "0.1",
+    })
+    os.environ.pop("PUSHOVER_TOKEN", None)
+    os.environ.setdefault("NOTIFY_COALESCE_WINDOW", "0.2")
+    # every request comes from one address; admission control is off unless asked for
+    for name in ("RATE_LIMIT_PER_MINUTE", "SESSION_RATE_LIMIT_PER_MINUTE", "UNKNOWN_QUESTIONS_PER_HOUR", "TOKENS_PER_MINUTE"):
+        os.environ.setdefault(name, "0")
+    genai.GenerativeModel = FakeGemini
+    genai.list_models = fake_list_models
+    import app
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.ERROR)
+
+    jobs = build_jobs(args.requests, args.sessions, rng)
+    server, base_url = start_server(app.app)
+    samples, elapsed = asyncio.run(run_load(base_url, jobs, args.concurrency, args.stream, rng))
+    server.should_exit = True
+    settled = wait_for_notifications(app.dispatcher, stub, settle=float(os.environ["NOTIFY_COALESCE_WINDOW"]) + 0.5)
+
+    routes = {}
+    for sample in samples:
+        routes.setdefault(sample["route"], []).append(sample)
+    report = {
+        "requests": len(samples),
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else None,
+        "model_calls": FakeSettings.calls,
+        "routes": {
+            route: {
+                "count": len(items),
+                "errors": sum(1 for s in items if s["status"] not in (200, 429)),
+                "rejected_429": sum(1 for s in items if s["status"] == 429),
+                "latency": latency_summary([s["seconds"] for s in items if s["status"] == 200]),
+                "ttft": latency_summary([s["ttft"] for s in items if s.get("ttft") is not None]),
+            }
+            for route, items in sorted(routes.items())
+        },
+        "notifications": {
+            "delivered_messages": len(stub.messages),
+            "stub_failures": stub.failures,
+            "dispatcher": app.dispatcher.stats(),
+            "settled": settled,
+        },
+        "pre_classifier": {
+            "threshold": app.SCOPE_THRESHOLD if app.me.scope_classifier is not None else None,
+            "answered": app.REPLIES.value(source="classifier"),
+        },
+        "classification": classification(
+            {message for job in jobs for message in job if message in TEST_PROMPTS}, stub.recorded_questions(),
+        ),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['requests']} requests, concurrency {args.concurrency}: {report['elapsed_s']} s, "
+              f"{report['throughput_rps']} req/s, {report['model_calls']} model calls")
+        print()
+        print(f"{'route':<14} {'count':>6} {'errors':>7} {'429':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttft p50':>9}")
+        for route, r in report["routes"].items():
+            lat = r["latency"] or {}
+            ttft = r["ttft"] or {}
+            print(f"{route:<14} {r['count']:>6} {r['errors']:>7} {r['rejected_429']:>5} {lat.get('p50_ms', '-'):>8} "
+                  f"{lat.get('p95_ms', '-'):>8} {lat.get('p99_ms', '-'):>8} {ttft.get('p50_ms', '-'):>9}")
+        n = report["notifications"]
+        print(f"\nnotifications: {n['delivered_messages']} delivered, {n['stub_failures']} stub failures, "
+              f"dispatcher {n['dispatcher']}{'' if settled else ' (did not settle)'}")
+        pre = report["pre_classifier"]
+        if pre["threshold"] is not None:
+            print(f"pre-classifier: {pre['answered']} replies without a model call (threshold {pre['threshold']})")
+        else:
+            print("pre-classifier: off")
+        c = report["classification"]
+        print(f"classification: accuracy {c['accuracy']} over {c['prompts']} prompts "
+              f"({c['true_positive']} recorded, {c['true_negative']} correctly not recorded)")
+        for question in c["false_negative"]:
+            print(f"  missed:         {question}")
+        for question in c["false_positive"]:
+            print(f"  wrongly logged: {question}")
+
+    status = 0
+    accuracy = report["classification"]["accuracy"]
+    if args.min_accuracy is not None and (accuracy is None or accuracy < args.min_accuracy):
+        print(f"\nFAIL: classification accuracy {accuracy} is below {args.min_accuracy}")
+        status = 1
+    chat = (report["routes"].get("/chat") or {}).get("latency") or {}
+    if args.max_p95_ms is not None and chat.get("p95_ms", float("inf")) > args.max_p95_ms:
+        print(f"\nFAIL: /chat p95 {chat.get('p95_ms')} ms exceeds budget {args.max_p95_ms:.0f} ms")
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
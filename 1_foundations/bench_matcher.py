@@ -0,0 +1,96 @@
+"""
+Micro-benchmark for the reply/message classification in intents.py.
+
+Compares the per-call cost of the compiled IntentMatcher against the
+original approach (lowercase, then `any(p in text for p in phrases)` per
+phrase list, plus an uncompiled re.findall letter count) over a set of
+sample messages and replies of different lengths.
+
+Usage:
+    python bench_matcher.py                  # default 20000 iterations per sample
+    python bench_matcher.py --number 50000
+    python bench_matcher.py --json           # machine-readable summary for CI logs
+"""
+import argparse
+import itertools
+import json
+import re
+import sys
+import timeit
+
+import intents
+
+LONG_ANSWER = (
+    "I've spent the last few years building production AI systems in Python: retrieval "
+    "pipelines, FastAPI backends and evaluation tooling for LLM applications. "
+) * 8
+
+SAMPLES = {
+    "message_short": "Can you send me your resume?",
+    "message_plain": "What kind of projects have you built with FastAPI and LLMs?",
+    "reply_answer": LONG_ANSWER,
+    "reply_fallback": "That question is outside the scope of my professional background, so I'll record it for later.",
+    "reply_sdk_json": '{"candidates": [{"content": {"parts": []}}], "usage_metadata": {"prompt_token_count": 12}}',
+}
+
+_ALNUM_RE = re.compile(r"[A-Za-z0-9]")
+
+
+def legacy_classifier(raw_intents):
+    def classify(text):
+        lower = text.lower()
+        found = set()
+        for name, phrases in raw_intents.items():
+            if any(p in lower for p in phrases):
+                found.add(name)
+        len(re.findall(r"[A-Za-z0-9]", text))
+        return found
+    return classify
+
+
+def compiled_classifier(matcher):
+    def classify(text):
+        found = matcher.classify(text)
+        sum(1 for _ in itertools.islice(_ALNUM_RE.finditer(text), 20))
+        return found
+    return classify
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    with open(intents.INTENTS_PATH, "r", encoding="utf-8") as f:
+        raw_intents = {name: [p.lower() for p in spec["phrases"]] for name, spec in json.load(f)["intents"].items()}
+    matcher = intents.IntentMatcher(raw_intents)
+    legacy = legacy_classifier(raw_intents)
+    compiled = compiled_classifier(matcher)
+
+    results = []
+    for name, text in SAMPLES.items():
+        if legacy(text) != set(compiled(text)):
+            raise SystemExit(f"classification mismatch on {name}: {legacy(text)} != {set(compiled(text))}")
+        legacy_us = min(timeit.repeat(lambda: legacy(text), number=args.number, repeat=3)) / args.number * 1e6
+        compiled_us = min(timeit.repeat(lambda: compiled(text), number=args.number, repeat=3)) / args.number * 1e6
+        results.append({
+            "sample": name,
+            "chars": len(text),
+            "intents": sorted(compiled(text)),
+            "legacy_us": round(legacy_us, 2),
+            "compiled_us": round(compiled_us, 2),
+        })
+
+    if args.json:
+        print(json.dumps({"number": args.number, "results": results}, indent=2))
+        return 0
+    print(f"{'sample':<16} {'chars':>6} {'legacy us':>10} {'compiled us':>12} {'speedup':>8}  intents")
+    for r in results:
+        speedup = r["legacy_us"] / r["compiled_us"] if r["compiled_us"] else float("inf")
+        print(f"{r['sample']:<16} {r['chars']:>6} {r['legacy_us']:>10.2f} {r['compiled_us']:>12.2f} {speedup:>7.1f}x  {','.join(r['intents']) or '-'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
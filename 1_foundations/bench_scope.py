@@ -0,0 +1,117 @@
+"""
+Benchmark for the scope pre-classifier in scope.py.
+
+Trains the classifier the way the app does (me/scope_examples.json plus the
+profile chunks), then reports training time, the per-question scoring cost,
+and accuracy on held-out questions at a range of thresholds: how many
+out-of-scope questions would skip the model (recall) and how many in-scope
+ones would wrongly be declined (false positives). The held-out set is
+TEST_PROMPTS plus HELD_OUT_IN_SCOPE_PROMPTS, the greetings and recruiter
+questions a declined visitor would notice most. The threshold the app uses
+is SCOPE_THRESHOLD (default 0.8).
+
+Declining an in-scope question costs more than calling the model for an
+out-of-scope one, so the run fails (exit 1) if, at --threshold, any held-out
+in-scope prompt or any frontend suggestion prompt (SUGGESTION_PROMPTS, which
+are also training examples) is declined.
+
+Usage:
+    python bench_scope.py                     # threshold sweep
+    python bench_scope.py --verbose           # plus every prompt's probability
+    python bench_scope.py --json              # machine-readable summary for CI logs
+    python bench_scope.py --min-accuracy 0.7 --max-false-positives 0   # exit 1 on regression
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import timeit
+
+import profile_artifact
+import response_cache
+import scope
+from test_prompts import HELD_OUT_IN_SCOPE_PROMPTS, IN_SCOPE_PROMPTS, SUGGESTION_PROMPTS, TEST_PROMPTS
+
+THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("SCOPE_THRESHOLD", "0.8")))
+    parser.add_argument("--number", type=int, default=20000, help="scoring calls to time")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--min-accuracy", type=float, default=None, help="fail if accuracy at --threshold is lower")
+    parser.add_argument("--max-false-positives", type=int, default=None, help="fail if more in-scope prompts are declined")
+    args = parser.parse_args()
+
+    in_scope_examples, out_of_scope_examples = scope.load_examples()
+    out_of_scope = [p for p in TEST_PROMPTS if p not in IN_SCOPE_PROMPTS]
+    in_scope = IN_SCOPE_PROMPTS + HELD_OUT_IN_SCOPE_PROMPTS
+    held_out = {response_cache.normalize_message(p) for p in out_of_scope + in_scope}
+    leaked = [q for q in in_scope_examples + out_of_scope_examples if response_cache.normalize_message(q) in held_out]
+    if leaked:
+        raise SystemExit(f"scope_examples.json contains held-out prompts: {leaked}")
+
+    artifact = profile_artifact.load_or_build()
+    started = time.perf_counter()
+    classifier = scope.train_for_profile(artifact["index"]["chunks"], threshold=args.threshold)
+    train_ms = (time.perf_counter() - started) * 1000
+
+    sample = "What's the recipe for samosa?"
+    score_us = min(timeit.repeat(lambda: classifier.probability(sample), number=args.number, repeat=3)) / args.number * 1e6
+
+    sweep = [classifier.evaluate(in_scope, out_of_scope, threshold) for threshold in sorted({*THRESHOLDS, args.threshold})]
+    chosen = next(r for r in sweep if r["threshold"] == args.threshold)
+    declined = [p for p in SUGGESTION_PROMPTS + in_scope if classifier.probability(p) >= args.threshold]
+    report = {
+        "examples": {"in_scope": len(in_scope_examples), "out_of_scope": len(out_of_scope_examples)},
+        "profile_chunks": len(artifact["index"]["chunks"]),
+        "vocabulary": len(classifier.idf),
+        "train_ms": round(train_ms, 1),
+        "score_us": round(score_us, 2),
+        "held_out": {"in_scope": len(in_scope), "out_of_scope": len(out_of_scope)},
+        "threshold": args.threshold,
+        "result": chosen,
+        "declined_in_scope": declined,
+        "sweep": sweep,
+        "probabilities": {p: round(classifier.probability(p), 4) for p in out_of_scope + in_scope + SUGGESTION_PROMPTS},
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print(f"trained on {len(in_scope_examples)} in-scope + {len(out_of_scope_examples)} out-of-scope examples "
+              f"and {report['profile_chunks']} profile chunks ({report['vocabulary']} terms) in {train_ms:.0f} ms")
+        print(f"scoring: {score_us:.1f} us per question\n")
+        print(f"held out: {len(out_of_scope)} out-of-scope and {len(in_scope)} in-scope prompts")
+        print(f"{'threshold':>9} {'accuracy':>9} {'precision':>10} {'recall':>7} {'skipped':>8} {'false +':>8}")
+        for r in sweep:
+            mark = "  <- SCOPE_THRESHOLD" if r["threshold"] == args.threshold else ""
+            print(f"{r['threshold']:>9.2f} {r['accuracy']:>9.4f} {r['precision'] or 0:>10.4f} {r['recall']:>7.4f} "
+                  f"{r['short_circuited']:>8} {r['false_positives']:>8}{mark}")
+        if args.verbose:
+            print()
+            for prompt, probability in report["probabilities"].items():
+                label = "sug" if prompt in SUGGESTION_PROMPTS else "in " if prompt in in_scope else "out"
+                decision = "skip model" if probability >= args.threshold else ""
+                print(f"  {probability:6.3f}  {label}  {prompt:45} {decision}")
+
+    failed = False
+    if declined:
+        print(f"\nFAIL: {len(declined)} in-scope or suggestion prompt(s) declined at threshold {args.threshold}:")
+        for prompt in declined:
+            print(f"  {classifier.probability(prompt):.3f}  {prompt}")
+        failed = True
+    if args.min_accuracy is not None and chosen["accuracy"] < args.min_accuracy:
+        print(f"\nFAIL: accuracy {chosen['accuracy']} at threshold {args.threshold} is below {args.min_accuracy}")
+        failed = True
+    if args.max_false_positives is not None and chosen["false_positives"] > args.max_false_positives:
+        print(f"\nFAIL: {chosen['false_positives']} in-scope prompts declined (allowed {args.max_false_positives})")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Cold-start benchmark for the FastAPI entry point.
+
+Imports `app` in fresh interpreters with `python -X importtime`, then reports
+the wall-clock time of the import (module imports + Me() construction) and
+the slowest imported modules by cumulative time.
+
+Usage:
+    python bench_startup.py                 # 3 runs, top 15 modules
+    python bench_startup.py --runs 5 --top 25
+    python bench_startup.py --max-ms 4000   # exit 1 if median import exceeds 4s
+    python bench_startup.py --json          # machine-readable summary for CI logs
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+# Prints the wall-clock import time on stdout; -X importtime writes per-module
+# timings to stderr.
+PROBE = "import time; t = time.perf_counter(); import app; print((time.perf_counter() - t) * 1000)"
+
+
+def run_once():
+    env = dict(os.environ)
+    # importing app requires a key; no request is made, so any value will do
+    env.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=HERE, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-2000:])
+        raise SystemExit(f"import app failed with exit code {proc.returncode}")
+    wall_ms = float(proc.stdout.strip().splitlines()[-1])
+    modules = {}
+    for line in proc.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        try:
+            _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+            modules[name] = (int(self_us), int(cumulative_us))
+        except ValueError:
+            continue
+    return wall_ms, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if the median import time exceeds this")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    walls = []
+    modules = {}
+    for _ in range(args.runs):
+        wall_ms, modules = run_once()
+        walls.append(wall_ms)
+    median_ms = statistics.median(walls)
+    top = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+
+    if args.json:
+        print(json.dumps({
+            "runs": walls,
+            "median_ms": round(median_ms, 1),
+            "top_modules": [{"module": name, "cumulative_ms": round(cum / 1000, 1)} for name, (_, cum) in top],
+        }, indent=2))
+    else:
+        print(f"import app: median {median_ms:.0f} ms over {args.runs} run(s) ({', '.join(f'{w:.0f}' for w in walls)})")
+        print()
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for name, (self_us, cum_us) in top:
+            print(f"{cum_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+        if "gradio" in modules:
+            print("\nWARNING: gradio was imported on the FastAPI path")
+
+    if args.max_ms is not None and median_ms > args.max_ms:
+        print(f"\nFAIL: median import time {median_ms:.0f} ms exceeds budget {args.max_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
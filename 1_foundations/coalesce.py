@@ -0,0 +1,122 @@
+# coalesce.py
+"""Single-flight de-duplication of identical concurrent generations.
+
+When several visitors ask the same first question at the same moment (a
+shared link, a suggestion button), only the first request calls the model;
+the others attach to its in-flight generation and receive the same result.
+For streams every follower replays the leader's events from the start, so
+late joiners still get the whole reply.
+
+The generation runs in its own task, so the leader disconnecting does not
+cancel it for the followers (and the finished reply still reaches the reply
+cache). Keys are only held while a generation is in flight; anything that
+arrives after it finishes is the reply cache's job.
+"""
+import asyncio
+
+
+class _Flight:
+    """Events of one in-flight stream, replayable by any number of subscribers."""
+
+    def __init__(self):
+        self.events = []
+        self.finished = False
+        self.error = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, event):
+        self.events.append(event)
+        self._notify()
+
+    def finish(self, error=None):
+        self.finished = True
+        self.error = error
+        self._notify()
+
+    async def subscribe(self):
+        i = 0
+        while True:
+            changed = self._changed
+            while i < len(self.events):
+                yield self.events[i]
+                i += 1
+            if self.finished:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        # the event loop only keeps weak references to tasks
+        self._pumps = set()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _release(self, table, key, value):
+        if table.get(key) is value:
+            del table[key]
+
+    def _call_done(self, key, task):
+        self._release(self._calls, key, task)
+        if not task.cancelled():
+            # mark the error retrieved even if every caller has gone away
+            task.exception()
+
+    async def run(self, key, make_call):
+        """Await make_call(), sharing one in-flight call among concurrent callers with the same key."""
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(make_call())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._call_done(key, t))
+        else:
+            self.coalesced += 1
+        # shield: one caller going away must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def stream(self, key, make_stream):
+        """Iterate make_stream(), sharing one in-flight stream among concurrent callers with the same key."""
+        flight = self._streams.get(key)
+        if flight is None:
+            self.leaders += 1
+            flight = _Flight()
+            self._streams[key] = flight
+            pump = asyncio.ensure_future(self._pump(key, flight, make_stream))
+            self._pumps.add(pump)
+            pump.add_done_callback(self._pumps.discard)
+        else:
+            self.coalesced += 1
+        async for event in flight.subscribe():
+            yield event
+
+    async def _pump(self, key, flight, make_stream):
+        try:
+            async for event in make_stream():
+                flight.publish(event)
+        except Exception as e:
+            flight.finish(e)
+        else:
+            flight.finish()
+        finally:
+            if not flight.finished:
+                # cancelled: subscribers must not wait for events that won't come
+                flight.finish(RuntimeError("shared generation was cancelled"))
+            self._release(self._streams, key, flight)
+
+    def stats(self):
+        total = self.leaders + self.coalesced
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls) + len(self._streams),
+            "coalesced_rate": round(self.coalesced / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,128 @@
+# conversation.py
+"""Conversation history -> Gemini multi-turn `contents`, within a token budget.
+
+Clients send history in several shapes (the web frontends use
+{"role": "user"|"bot", "text"}, Gradio uses {"role", "content"} dicts or
+[user, bot] pairs). normalize_history() maps them all to (role, text)
+turns with Gemini's "user"/"model" roles. build_contents() keeps the most
+recent turns verbatim and folds everything older into a short extractive
+summary, so the prompt stays bounded however long the conversation gets.
+"""
+import functools
+import re
+
+USER = "user"
+MODEL = "model"
+
+_ROLE_ALIASES = {
+    "user": USER,
+    "human": USER,
+    "bot": MODEL,
+    "assistant": MODEL,
+    "model": MODEL,
+}
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def _turn_text(entry):
+    text = entry.get("text")
+    if text is None:
+        text = entry.get("content")
+    return text if isinstance(text, str) else ""
+
+
+def normalize_history(history, current_message=None):
+    """Return [(role, text), ...] oldest first, excluding the current message.
+
+    Leading model turns (e.g. the frontend greeting) are dropped so the
+    conversation starts with the visitor, and consecutive turns from the
+    same role are merged.
+    """
+    turns = []
+    for entry in history or []:
+        if isinstance(entry, dict):
+            role = _ROLE_ALIASES.get(str(entry.get("role", "")).lower())
+            text = _turn_text(entry)
+            if role and text.strip():
+                turns.append((role, text.strip()))
+        elif isinstance(entry, (list, tuple)) and len(entry) == 2:
+            user_text, bot_text = entry
+            if isinstance(user_text, str) and user_text.strip():
+                turns.append((USER, user_text.strip()))
+            if isinstance(bot_text, str) and bot_text.strip():
+                turns.append((MODEL, bot_text.strip()))
+
+    # clients that append the new message before sending include it in history
+    if current_message and turns and turns[-1] == (USER, current_message.strip()):
+        turns.pop()
+    while turns and turns[0][0] == MODEL:
+        turns.pop(0)
+    return _merge_consecutive(turns)
+
+
+def _merge_consecutive(turns):
+    merged = []
+    for role, text in turns:
+        if merged and merged[-1][0] == role:
+            merged[-1] = (role, merged[-1][1] + "\n\n" + text)
+        else:
+            merged.append((role, text))
+    return merged
+
+
+def first_sentence(text, max_chars=160):
+    first = _SENTENCE_END_RE.split(text.strip(), maxsplit=1)[0]
+    first = " ".join(first.split())
+    if len(first) > max_chars:
+        first = first[:max_chars - 1].rstrip() + "…"
+    return first
+
+
+@functools.lru_cache(maxsize=2048)
+def summarize_turn(role, text):
+    """One-line extractive summary of a turn; memoized so each turn is summarized once."""
+    speaker = "Visitor" if role == USER else "You"
+    return f"{speaker}: {first_sentence(text)}"
+
+
+def build_contents(turns, prompt, keep_last=6, token_budget=1500, summary_budget=300):
+    """Gemini `contents` for a conversation ending with `prompt` from the user.
+
+    Up to `keep_last` recent turns are kept verbatim while they fit in
+    `token_budget`; older turns are summarized (newest first) until
+    `summary_budget` tokens are used, and anything beyond is dropped.
+    """
+    recent = []
+    used = estimate_tokens(prompt)
+    older = list(turns)
+    while older and len(recent) < keep_last:
+        role, text = older[-1]
+        cost = estimate_tokens(text)
+        if used + cost > token_budget:
+            break
+        recent.insert(0, older.pop())
+        used += cost
+
+    summary_lines = []
+    summary_used = 0
+    for role, text in reversed(older):
+        line = summarize_turn(role, text)
+        summary_used += estimate_tokens(line)
+        if summary_used > summary_budget:
+            break
+        summary_lines.insert(0, line)
+
+    window = []
+    if summary_lines:
+        window.append((USER, "Summary of the earlier conversation:\n" + "\n".join(summary_lines)))
+    window.extend(recent)
+    while window and window[0][0] == MODEL:
+        window.pop(0)
+    window.append((USER, prompt))
+    return [{"role": role, "parts": [text]} for role, text in _merge_consecutive(window)]
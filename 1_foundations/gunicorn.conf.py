@@ -0,0 +1,51 @@
+"""
+Production serving mode: several uvicorn workers under gunicorn.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (preload_app), so the profile, the
+retrieval index and the system prompt are built before fork and shared
+copy-on-write by every worker; gc.freeze() keeps the garbage collector from
+touching (and so copying) those pages later. Each worker then starts its
+own background threads (see app.lifespan) and reopens its SQLite handles.
+
+Sessions, the reply cache and rate limits default to the SQLite stores in
+STATE_DIR so every worker sees the same state. Per-process state remains:
+in-flight request coalescing, router latency windows and /metrics, which
+report on whichever worker answers the scrape.
+
+Environment: PORT, WEB_CONCURRENCY (workers), GUNICORN_TIMEOUT.
+"""
+import gc
+import multiprocessing
+import os
+
+# shared stores unless configured otherwise; read when app is imported below
+os.environ.setdefault("SESSION_STORE", "sqlite")
+os.environ.setdefault("RESPONSE_CACHE", "sqlite")
+os.environ.setdefault("RATE_LIMIT_STORE", "sqlite")
+# lets gRPC (used by google-generativeai) cope with channels created before fork
+os.environ.setdefault("GRPC_ENABLE_FORK_SUPPORT", "1")
+
+try:
+    import uvicorn_worker  # noqa: F401
+    worker_class = "uvicorn_worker.UvicornWorker"
+except ImportError:
+    worker_class = "uvicorn.workers.UvicornWorker"
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(4, multiprocessing.cpu_count()))))
+preload_app = True
+# streamed replies can legitimately run for a while
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = None
+
+
+def when_ready(server):
+    # everything allocated so far (the preloaded app) is shared with the workers;
+    # move it out of the collector's reach so they don't dirty those pages
+    gc.collect()
+    gc.freeze()
+    server.log.info("Preloaded app; starting %d worker(s)", server.cfg.workers)
@@ -0,0 +1,270 @@
+# http_cache.py
+"""HTTP caching and compression for the files the app serves.
+
+file_response() serves a file with a strong ETag and Last-Modified, answers
+If-None-Match / If-Modified-Since with 304 and single byte ranges (honouring
+If-Range) with 206, and streams the body from a worker thread in chunks.
+
+CompressionMiddleware compresses text-like responses (HTML, JSON, JS, CSS,
+SVG, plain text) with brotli when the optional `brotli` package is installed
+and the client accepts it, else gzip. Streams (text/event-stream), ranges and
+already-encoded bodies pass through untouched. A compressed body is cached by
+(path, ETag, encoding), so the HTML page is compressed once per deploy, not once
+per visit; the compressed response gets the weak form of the ETag, which
+still validates against the original.
+
+CachedStaticFiles is StaticFiles with Cache-Control: requests carrying a
+version query (?v=...) are cached as immutable for a year, anything else
+for `max_age` seconds and then revalidated with the ETag.
+"""
+import email.utils
+import gzip
+from collections import OrderedDict
+
+from fastapi.responses import Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE = "public, max-age=31536000, immutable"
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+    "text/css",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+    "text/xml",
+}
+
+
+# ---------- conditional and range requests ----------
+
+def _strip_weak(tag):
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request_headers, etag, mtime):
+    """True if the client's cached copy (If-None-Match, else If-Modified-Since) is current."""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        # weak comparison, as RFC 9110 requires for If-None-Match
+        tags = [_strip_weak(tag) for tag in if_none_match.split(",")]
+        return "*" in tags or _strip_weak(etag) in tags
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single "bytes=" range, "unsatisfiable", or None to send the whole file."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # multipart ranges are rare enough to answer with the full body
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return "unsatisfiable"
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return "unsatisfiable"
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(if_range, etag, last_modified):
+    if if_range is None:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # If-Range needs a strong match; a weak tag never matches
+        return if_range == etag
+    return if_range == last_modified
+
+
+def _iter_file(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(request, path, media_type, cache_control, filename=None):
+    """Serve `path` with validators, 304s and single-range 206s."""
+    stat = path.stat()
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if is_not_modified(request.headers, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    start, end, status = 0, stat.st_size - 1, 200
+    range_header = request.headers.get("range")
+    if range_header and _if_range_matches(request.headers.get("if-range"), etag, last_modified):
+        byte_range = parse_range(range_header, stat.st_size)
+        if byte_range == "unsatisfiable":
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{stat.st_size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_iter_file(path, start, end), status_code=status, media_type=media_type, headers=headers)
+
+
+# ---------- compression ----------
+
+def accepted_encoding(accept_encoding):
+    """"br", "gzip" or None for an Accept-Encoding header value."""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    # mtime=0 keeps the output, and so any cached copy, byte-for-byte stable
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=1024, cache_entries=32):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()  # (path, etag, encoding) -> compressed body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = accepted_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        # the body has to come through send() to be compressed
+        extensions = {k: v for k, v in scope.get("extensions", {}).items() if k != "http.response.pathsend"}
+        await self.app(dict(scope, extensions=extensions), receive, _Compressor(self, encoding, send, scope["path"]).send)
+
+    def compressed(self, body, encoding, etag, path):
+        if etag is None:
+            return compress(body, encoding)
+        # ETags are only unique per resource: two routes may well hand out the same one
+        key = (path, etag, encoding)
+        cached = self._cache.get(key)
+        if cached is None:
+            cached = self._cache[key] = compress(body, encoding)
+            if len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return cached
+
+
+class _Compressor:
+    """send() wrapper for one response: buffers an eligible body, then compresses it."""
+
+    def __init__(self, middleware, encoding, send, path):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.path = path
+        self._send = send
+        self.start = None
+        self.eligible = False
+        self.chunks = []
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+            self.eligible = (
+                message["status"] == 200
+                and media_type in COMPRESSIBLE_TYPES
+                and "content-encoding" not in headers
+                and "content-range" not in headers
+            )
+            if self.eligible:
+                self.start = message
+            else:
+                await self._send(message)
+            return
+        if not self.eligible or message["type"] != "http.response.body":
+            await self._send(message)
+            return
+        self.chunks.append(message.get("body", b""))
+        if message.get("more_body", False):
+            return
+        body = b"".join(self.chunks)
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers.add_vary_header("Accept-Encoding")
+        if len(body) >= self.middleware.minimum_size:
+            etag = headers.get("etag")
+            body = self.middleware.compressed(body, self.encoding, etag, self.path)
+            headers["Content-Encoding"] = self.encoding
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+        headers["Content-Length"] = str(len(body))
+        await self._send(self.start)
+        await self._send({"type": "http.response.body", "body": body})
+
+
+# ---------- static files ----------
+
+class CachedStaticFiles(StaticFiles):
+    def __init__(self, *args, max_age=3600, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_age = max_age
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        versioned = any(part.startswith(b"v=") for part in scope.get("query_string", b"").split(b"&"))
+        response.headers["Cache-Control"] = IMMUTABLE if versioned else f"public, max-age={self.max_age}"
+        return response
@@ -0,0 +1,166 @@
+# intents.py
+"""Precompiled phrase matcher for classifying messages and replies.
+
+The phrase lists live in me/intents.json as {"intents": {name: {"description",
+"phrases"}}}. IntentMatcher compiles the phrases of every intent into one
+prefix-factored alternation (a regex trie), so a text is lowercased once and
+scanned once, in C, however many phrases and intents there are. The pattern
+deliberately has no capture groups: a leading group disables the regex
+engine's first-character skip and makes the scan several times slower, so
+the intent is looked up from the matched phrase instead.
+
+Matching is substring-based like the `in` checks it replaces, which suits
+phrases looked for in model replies. A matcher built with whole_words=True
+only matches phrases between word boundaries, which is what visitor
+messages need: "reach you" is not in "reach your goals". At each position
+the longest phrase wins and is credited to every intent with a phrase
+inside it; only a phrase overlapping the tail of a longer match of a
+different intent can be missed. Straight and curly apostrophes are
+interchangeable.
+
+CannedReplies is the intent -> fixed reply table in me/canned_replies.json.
+Its {placeholders} are filled in once per profile load (render()), so
+answering a matching message is one scan plus a list walk.
+"""
+import json
+import os
+import re
+from pathlib import Path
+
+INTENTS_PATH = Path(os.getenv("INTENTS_PATH", Path(__file__).resolve().parent / "me" / "intents.json"))
+CANNED_REPLIES_PATH = Path(
+    os.getenv("CANNED_REPLIES_PATH", Path(__file__).resolve().parent / "me" / "canned_replies.json")
+)
+
+_APOSTROPHES = "['’]"
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+
+def _contains(text, phrase, whole_words=False):
+    if not whole_words:
+        return phrase in text
+    return re.search(rf"(?<!\w){re.escape(phrase)}(?!\w)", text) is not None
+
+
+def minimal_phrases(phrases, whole_words=False):
+    """Lowercase and dedupe, dropping phrases that contain another phrase."""
+    normalized = sorted({p.lower().replace("’", "'").strip() for p in phrases} - {""}, key=len)
+    kept = []
+    for phrase in normalized:
+        if not any(_contains(phrase, shorter, whole_words) for shorter in kept):
+            kept.append(phrase)
+    return kept
+
+
+def _char_pattern(ch):
+    return _APOSTROPHES if ch == "'" else re.escape(ch)
+
+
+def trie_pattern(phrases):
+    """Regex source matching any of `phrases`, with shared prefixes factored out."""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    return _emit(trie)
+
+
+def _emit(node):
+    optional = "" in node
+    branches = [_char_pattern(ch) + _emit(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    if len(branches) == 1 and not optional:
+        return branches[0]
+    group = "(?:" + "|".join(branches) + ")"
+    return group + "?" if optional else group
+
+
+class IntentMatcher:
+    def __init__(self, intents, whole_words=False):
+        """`intents` maps an intent name to its phrases; see the module docstring for `whole_words`."""
+        self.phrases = {name: minimal_phrases(phrases, whole_words) for name, phrases in intents.items()}
+        all_phrases = {p for phrases in self.phrases.values() for p in phrases}
+        # a phrase implies every intent that has a phrase contained in it
+        self._intents_by_phrase = {
+            phrase: frozenset(
+                name for name, phrases in self.phrases.items() if any(_contains(phrase, p, whole_words) for p in phrases)
+            )
+            for phrase in all_phrases
+        }
+        pattern = trie_pattern(all_phrases)
+        if pattern and whole_words:
+            # lookarounds rather than \b, so phrases may start or end with punctuation
+            pattern = rf"(?<!\w)(?:{pattern})(?!\w)"
+        # (?!) never matches, so an empty configuration classifies nothing
+        self.pattern = re.compile(pattern or "(?!)")
+
+    @classmethod
+    def from_file(cls, path=INTENTS_PATH, whole_words=False):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls({name: spec.get("phrases", []) for name, spec in data["intents"].items()}, whole_words)
+
+    def longest(self, intent):
+        """Length of the longest phrase that can trigger `intent` (0 if none)."""
+        return max((len(p) for p in self.phrases.get(intent, ())), default=0)
+
+    def _scan(self, text):
+        for match in self.pattern.finditer(text.lower()):
+            yield self._intents_by_phrase[match.group().replace("’", "'")]
+
+    def classify(self, text):
+        """Set of intents with at least one phrase in `text`, from a single scan."""
+        found = set()
+        for hit in self._scan(text):
+            found |= hit
+            if len(found) == len(self.phrases):
+                break
+        return frozenset(found)
+
+    def matches(self, text, intent):
+        """True if any phrase of `intent` occurs in `text`; stops at the first hit."""
+        return any(intent in hit for hit in self._scan(text))
+
+
+class CannedReplies:
+    def __init__(self, entries, matcher):
+        """`entries` is a list of {"intent", "reply", "requires"?}, in priority order."""
+        unknown = {entry["intent"] for entry in entries} - set(matcher.phrases)
+        if unknown:
+            raise ValueError(f"canned replies for intents without phrases: {sorted(unknown)}")
+        self.entries = entries
+        self.matcher = matcher
+        self._ready = []
+
+    @classmethod
+    def from_file(cls, matcher, path=CANNED_REPLIES_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["replies"], matcher)
+
+    def render(self, facts):
+        """Fill in every reply from `facts`, skipping entries with a missing placeholder or requirement.
+
+        Returns the intents that can be answered.
+        """
+        ready = []
+        for entry in self.entries:
+            needed = set(entry.get("requires", ())) | set(_PLACEHOLDER_RE.findall(entry["reply"]))
+            if all(facts.get(name) for name in needed):
+                reply = _PLACEHOLDER_RE.sub(lambda m: str(facts[m.group(1)]), entry["reply"])
+                ready.append((entry["intent"], reply))
+        self._ready = ready
+        return [intent for intent, _ in ready]
+
+    def match(self, message):
+        """(intent, reply) for the first rendered entry whose intent occurs in `message`, else None."""
+        if not self._ready:
+            return None
+        found = self.matcher.classify(message)
+        for intent, reply in self._ready:
+            if intent in found:
+                return intent, reply
+        return None
@@ -0,0 +1,206 @@
+# logs.py
+"""Logging setup: text or JSON lines, written off the request thread.
+
+configure() installs a single QueueHandler on the root logger; a
+QueueListener thread does the formatting and the writes, so a chat request
+only pays for building the record, merging its arguments and putting it on
+a queue. Records are
+tagged with the current request id (see bind_request()), so every line of
+one request can be found again, including lines from tool threads that run
+under a copied context.
+
+Verbose lines are sampled per request: with LOG_SAMPLE_RATE=0.1 the INFO
+and DEBUG lines of about one request in ten are kept, whole, while warnings
+and errors and anything logged outside a request are always kept.
+
+Secrets and PII are redacted from messages and tracebacks in the listener
+thread:
+values of the configured secret environment variables, API-key and
+bot-token shaped strings, and (unless LOG_REDACT_PII=false) email addresses
+and phone numbers.
+
+Environment: LOG_FORMAT (text|json), LOG_LEVEL, LOG_SAMPLE_RATE,
+LOG_REDACT_PII.
+"""
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import uuid
+
+SECRET_ENV_VARS = ("GEMINI_API_KEY", "TELEGRAM_BOT_TOKEN", "PUSHOVER_TOKEN", "PUSHOVER_USER", "BATCH_TOKEN")
+
+_SECRET_PATTERNS = (
+    re.compile(r"AIza[0-9A-Za-z_\-]{35}"),              # Google API keys
+    re.compile(r"\b\d{6,12}:[0-9A-Za-z_\-]{30,}\b"),    # Telegram bot tokens
+)
+_EMAIL_RE = re.compile(r"[\w.+\-]+@[\w\-]+(?:\.[\w\-]+)+")
+# ten or more digits and separators, not an ISO date
+_PHONE_RE = re.compile(r"(?<![\w.])(?!\d{4}-\d\d-\d\d)\+?\d[\d ().\-]{8,}\d(?![\w.])")
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_sampled = contextvars.ContextVar("log_sampled", default=True)
+
+# LogRecord attributes that are not "extra" fields
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+
+def bind_request(request_id=None, sample_rate=None):
+    """Tag the current context's log lines with a request id and make its sampling decision.
+
+    Returns the request id. Context variables follow asyncio tasks; for
+    executor threads, submit through contextvars.copy_context().run.
+    """
+    request_id = request_id or new_request_id()
+    rate = settings.sample_rate if sample_rate is None else sample_rate
+    _request_id.set(request_id)
+    _sampled.set(rate >= 1 or random.random() < rate)
+    return request_id
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+class Redactor:
+    def __init__(self, secrets=(), pii=True):
+        self.secrets = sorted({s for s in secrets if s and len(s) >= 6}, key=len, reverse=True)
+        self.pii = pii
+
+    @classmethod
+    def from_env(cls, pii=True):
+        return cls([os.getenv(name, "") for name in SECRET_ENV_VARS], pii=pii)
+
+    def __call__(self, text):
+        for secret in self.secrets:
+            if secret in text:
+                text = text.replace(secret, "[REDACTED]")
+        for pattern in _SECRET_PATTERNS:
+            text = pattern.sub("[REDACTED]", text)
+        if self.pii:
+            if "@" in text:
+                text = _EMAIL_RE.sub("[email]", text)
+            text = _PHONE_RE.sub("[phone]", text)
+        return text
+
+
+class ContextFilter(logging.Filter):
+    """Runs on the caller's thread: attach the request id, drop unsampled verbose lines."""
+
+    def filter(self, record):
+        request_id = _request_id.get()
+        record.request_id = request_id
+        return record.levelno >= logging.WARNING or request_id is None or _sampled.get()
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self, redact):
+        super().__init__("%(asctime)s %(levelname)s %(message)s")
+        self.redact = redact
+
+    def format(self, record):
+        if record.exc_text:
+            # QueueHandler.prepare() already rendered the traceback
+            record.exc_text = self.redact(record.exc_text)
+        return super().format(record)
+
+    def formatMessage(self, record):
+        record.message = self.redact(record.message)
+        if getattr(record, "request_id", None):
+            record.message = f"[{record.request_id}] {record.message}"
+        return super().formatMessage(record)
+
+    def formatException(self, exc_info):
+        return self.redact(super().formatException(exc_info))
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, redact):
+        super().__init__()
+        self.redact = redact
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": self.redact(record.getMessage()),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value if isinstance(value, (int, float, bool, type(None))) else self.redact(str(value))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = self.redact(record.exc_text)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class Settings:
+    sample_rate = 1.0
+
+
+settings = Settings()
+_listener = None
+_queue_handler = None
+
+
+def configure(fmt=None, level=None, sample_rate=None, redact_pii=None, stream=None):
+    """Route all logging through a queue to one formatted stream handler. Safe to call again."""
+    global _listener, _queue_handler
+    fmt = (fmt or os.getenv("LOG_FORMAT", "text")).lower()
+    level = level or os.getenv("LOG_LEVEL", "INFO").upper()
+    settings.sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "1") if sample_rate is None else sample_rate)
+    if redact_pii is None:
+        redact_pii = os.getenv("LOG_REDACT_PII", "true").lower() == "true"
+
+    redact = Redactor.from_env(pii=redact_pii)
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter(redact) if fmt == "json" else TextFormatter(redact))
+
+    root = logging.getLogger()
+    shutdown()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    _queue_handler.addFilter(ContextFilter())
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def _restart_after_fork():
+    # the listener thread does not survive fork(); give the child its own
+    global _listener
+    if _listener is None:
+        return
+    _queue_handler.queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown():
+    """Flush queued records and stop the listener thread; registered with atexit."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
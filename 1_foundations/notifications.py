@@ -0,0 +1,198 @@
+# notifications.py
+"""Background delivery of owner notifications (Telegram / Pushover).
+
+Chat requests only enqueue a notification; a single worker thread owns the
+network calls, retries failures with exponential backoff and folds bursts
+of unknown-question alerts into one message. Every pending notification is
+also written to a spool directory and removed once delivered, so alerts
+queued before a restart are sent when the process comes back.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: no other workers to coordinate with
+    fcntl = None
+
+UNKNOWN_QUESTION = "unknown_question"
+USER_DETAILS = "user_details"
+
+
+class NotificationDispatcher:
+    """Queue + worker thread in front of a blocking ``send(text) -> bool`` callable."""
+
+    def __init__(self, send, spool_dir=None, max_attempts=5, backoff_base=2.0,
+                 backoff_max=60.0, coalesce_window=3.0, max_batch=20):
+        self.send = send
+        self.spool_dir = spool_dir
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.coalesce_window = coalesce_window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._replayed = False
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        if spool_dir is not None:
+            spool_dir.mkdir(parents=True, exist_ok=True)
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if not self._replayed:
+                self._replayed = True
+                self._replay_spool()
+            self._thread = threading.Thread(target=self._run, name="notification-dispatcher", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, kind, text):
+        """Queue a notification and return immediately.
+
+        For UNKNOWN_QUESTION items ``text`` is the bare question; other kinds
+        are sent verbatim.
+        """
+        # start (and replay the spool) before spooling this item, so it is not queued twice
+        self.start()
+        item = {"id": f"{time.time():.6f}-{uuid.uuid4().hex[:8]}", "kind": kind, "text": text}
+        self._spool(item)
+        self._queue.put(item)
+        return item["id"]
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {"pending": self.pending(), "sent": self.sent, "failed": self.failed, "coalesced": self.coalesced}
+
+    # ---- spool ----
+
+    def _spool_path(self, item):
+        return self.spool_dir / f"{item['id']}.json"
+
+    def _spool(self, item):
+        if self.spool_dir is None:
+            return
+        try:
+            with open(self._spool_path(item), "w", encoding="utf-8") as f:
+                json.dump(item, f)
+        except OSError as e:
+            logging.warning("Could not spool notification %s: %s", item["id"], e)
+
+    def _unspool(self, items):
+        if self.spool_dir is None:
+            return
+        for item in items:
+            try:
+                self._spool_path(item).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning("Could not remove spooled notification %s: %s", item["id"], e)
+
+    def _claim_spool(self):
+        """True if this process may replay the spool; with several workers only one does.
+
+        The lock is held for the life of the process, so workers started
+        later leave the files of live workers alone.
+        """
+        if fcntl is None:
+            return True
+        lock = open(self.spool_dir / ".replay.lock", "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return False
+        self._spool_lock = lock
+        return True
+
+    def _replay_spool(self):
+        if self.spool_dir is None:
+            return
+        if not self._claim_spool():
+            logging.info("Notification spool is replayed by another worker")
+            return
+        replayed = 0
+        for path in sorted(self.spool_dir.glob("*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._queue.put(json.load(f))
+                replayed += 1
+            except (OSError, ValueError) as e:
+                logging.warning("Skipping unreadable spooled notification %s: %s", path, e)
+        if replayed:
+            logging.info("Replaying %d spooled notification(s)", replayed)
+
+    # ---- worker ----
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            if item["kind"] == UNKNOWN_QUESTION:
+                batch.extend(self._collect_unknown_questions())
+            self._deliver(batch)
+
+    def _collect_unknown_questions(self):
+        """Gather further unknown-question alerts arriving within the coalesce window."""
+        extra = []
+        deferred = []
+        deadline = time.monotonic() + self.coalesce_window
+        while len(extra) + 1 < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item["kind"] == UNKNOWN_QUESTION:
+                extra.append(item)
+            else:
+                deferred.append(item)
+        for item in deferred:
+            self._queue.put(item)
+        return extra
+
+    def _format(self, batch):
+        if batch[0]["kind"] != UNKNOWN_QUESTION:
+            return batch[0]["text"]
+        if len(batch) == 1:
+            return f"Recording unknown question: {batch[0]['text']}"
+        lines = "\n".join(f"- {item['text']}" for item in batch)
+        return f"Recording {len(batch)} unknown questions:\n{lines}"
+
+    def _deliver(self, batch):
+        text = self._format(batch)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                ok = self.send(text)
+            except Exception as e:
+                logging.exception("Notification send raised: %s", e)
+                ok = False
+            if ok:
+                self.sent += len(batch)
+                # counted once delivered, so a failed batch replayed later isn't counted twice
+                if len(batch) > 1 and batch[0]["kind"] == UNKNOWN_QUESTION:
+                    self.coalesced += len(batch) - 1
+                self._unspool(batch)
+                return True
+            if attempt < self.max_attempts:
+                delay = min(self.backoff_max, self.backoff_base ** attempt)
+                logging.warning("Notification delivery failed (attempt %d/%d), retrying in %.0fs",
+                                attempt, self.max_attempts, delay)
+                time.sleep(delay)
+        # left in the spool, so it is retried after the next restart
+        self.failed += len(batch)
+        logging.error("Giving up on %d notification(s) after %d attempts", len(batch), self.max_attempts)
+        return False
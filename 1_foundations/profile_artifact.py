@@ -0,0 +1,172 @@
+# profile_artifact.py
+"""Precomputed profile artifact built from the documents in me/.
+
+Parsing the PDFs is by far the slowest part of building the persona, so it
+is done once, offline, into a single versioned JSON file holding the
+sanitized text of every source, its SHA-256, the retrieval index and the
+scope pre-classifier's weights (see scope.py). At
+startup `Me` loads that file in a few milliseconds and only falls back to
+live parsing when a source hash no longer matches (or the file is missing).
+
+Build it as part of the deploy:
+    python -m app build-profile
+or directly:
+    python profile_artifact.py [--output PATH]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+import retrieval
+import scope
+
+# bump when the stored index or scope model would be read differently (e.g. scope.terms() changes)
+ARTIFACT_VERSION = 2
+
+ME_DIR = Path(__file__).resolve().parent / "me"
+ARTIFACT_PATH = ME_DIR / ".index" / "profile.json"
+PROFILE_SOURCES = [
+    ME_DIR / "summary.txt",
+    ME_DIR / "linkedin.pdf",
+    ME_DIR / "Priyanshu_Sharma_Resume.pdf",
+]
+
+_URL_RE = re.compile(r"https?://\S+")
+
+
+def file_hash(path):
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def parse_pdf_text(path):
+    # pypdf is only needed when the artifact has to be (re)built
+    from pypdf import PdfReader
+
+    text = ""
+    reader = PdfReader(str(path))
+    for page in reader.pages:
+        page_text = page.extract_text()
+        if page_text:
+            text += page_text
+    return text
+
+
+def extract_document_text(path):
+    if path.suffix.lower() == ".pdf":
+        text = parse_pdf_text(path)
+    else:
+        text = path.read_text(encoding="utf-8")
+    # sanitize any URLs from parsed text to avoid leaking or hallucinated links
+    return _URL_RE.sub("", text)
+
+
+def build(sources=PROFILE_SOURCES):
+    """Parse, sanitize, chunk and index every source document."""
+    documents = {}
+    chunks = []
+    for path in sources:
+        digest = file_hash(path)
+        text = ""
+        if digest is not None:
+            try:
+                text = extract_document_text(path)
+            except Exception as e:
+                logging.warning("Failed to extract %s: %s", path, e)
+        documents[path.name] = {"sha256": digest, "text": text}
+        chunks.extend(retrieval.chunk_text(text, path.name))
+    return {
+        "version": ARTIFACT_VERSION,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "sources": documents,
+        "index": retrieval.BM25Index(chunks).to_dict(),
+        "scope": build_scope_model(chunks),
+    }
+
+
+def build_scope_model(chunks, examples_path=scope.EXAMPLES_PATH):
+    """The scope pre-classifier's weights with the hash of the examples they came from, or None."""
+    digest = scope.examples_hash(examples_path)
+    if digest is None:
+        return None
+    try:
+        model = scope.train_for_profile(chunks, examples_path)
+    except (ValueError, KeyError) as e:
+        logging.warning("Cannot train the scope classifier from %s: %s", examples_path, e)
+        return None
+    return {"examples_sha256": digest, "model": model.to_dict()}
+
+
+def load(path=ARTIFACT_PATH, sources=PROFILE_SOURCES):
+    """Return the artifact if it exists and matches every source hash, else None."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            artifact = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning("Ignoring unreadable profile artifact %s: %s", path, e)
+        return None
+    if artifact.get("version") != ARTIFACT_VERSION:
+        logging.info("Profile artifact %s has version %s, expected %s", path, artifact.get("version"), ARTIFACT_VERSION)
+        return None
+    recorded = artifact.get("sources", {})
+    for source in sources:
+        if recorded.get(source.name, {}).get("sha256") != file_hash(source):
+            logging.info("Profile artifact is stale: %s changed", source.name)
+            return None
+    return artifact
+
+
+def write(artifact, path=ARTIFACT_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def load_or_build(path=ARTIFACT_PATH, sources=PROFILE_SOURCES):
+    """Load the artifact, rebuilding (and persisting, best effort) when it is missing or stale."""
+    artifact = load(path, sources)
+    if artifact is not None:
+        logging.info("Loaded profile artifact %s (built %s)", path, artifact.get("built_at"))
+        return artifact
+    logging.info("Building profile artifact from %s", ", ".join(s.name for s in sources))
+    artifact = build(sources)
+    try:
+        write(artifact, path)
+    except OSError as e:
+        logging.warning("Could not persist profile artifact to %s: %s", path, e)
+    return artifact
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the precomputed profile artifact from me/.")
+    parser.add_argument("--output", type=Path, default=ARTIFACT_PATH)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    artifact = build()
+    write(artifact, args.output)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for name, source in artifact["sources"].items():
+        status = f"{len(source['text'])} chars" if source["sha256"] else "missing"
+        print(f"  {name}: {status}")
+    if artifact["scope"]:
+        print(f"  scope classifier: {len(artifact['scope']['model']['weights'])} weights")
+    print(f"Wrote {args.output} ({len(artifact['index']['chunks'])} chunks) in {elapsed_ms:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    sys.exit(main())
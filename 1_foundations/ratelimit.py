@@ -0,0 +1,181 @@
+# ratelimit.py
+"""Admission control: per-client token buckets and a global model-token budget.
+
+A bucket holds up to `capacity` tokens and refills at `rate` tokens per
+second; a request is admitted if its cost can be taken from the bucket,
+otherwise it is told how long to wait (Retry-After). Buckets live in a
+MemoryBucketStore (per process) or a SQLiteBucketStore, which takes a write
+lock for each read-modify-write so every worker on the host shares the same
+limits.
+
+RateLimiter wraps one kind of bucket (per IP, per session, per client
+unknown-question alerts). TokenBudget is a single shared bucket that model
+usage is debited from after the fact, from usage_metadata, and may go into
+debt; while it is in debt new requests are turned away before they reach
+the model.
+
+The client of the current request is kept in a context variable (see
+bind_client()), so code running deeper in the request, including tool
+threads started under a copied context, can apply per-client limits.
+"""
+import contextvars
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import sqlite_store
+
+_client = contextvars.ContextVar("rate_limit_client", default=None)
+
+
+def bind_client(key):
+    _client.set(key)
+
+
+def current_client():
+    return _client.get()
+
+
+def client_ip(peer, forwarded_for=None, trusted_hops=0):
+    """The caller's address: `peer`, or the entry `trusted_hops` proxies back in X-Forwarded-For.
+
+    Each trusted proxy appends the address it saw, so the right-most entries
+    are the trustworthy ones; anything further left is client-supplied.
+    """
+    if trusted_hops > 0 and forwarded_for:
+        hops = [part.strip() for part in forwarded_for.split(",") if part.strip()]
+        if hops:
+            return hops[-min(trusted_hops, len(hops))]
+    return peer or "unknown"
+
+
+def retry_after_header(seconds):
+    return str(max(1, math.ceil(seconds)))
+
+
+def _refill(tokens, updated, rate, capacity, now):
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+class MemoryBucketStore:
+    def __init__(self, max_keys=50000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity, cost=1.0, debit=False, now=None):
+        """Refill `key`, then remove `cost` tokens if it holds them (always, with debit=True).
+
+        Returns (allowed, tokens_left). An unknown key starts full.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = _refill(tokens, updated, rate, capacity, now)
+            allowed = debit or tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                # least recently used first; a long-idle bucket is full anyway
+                self._buckets.popitem(last=False)
+            return allowed, tokens
+
+    def peek(self, key, rate, capacity, now=None):
+        """Tokens `key` would hold now, without touching the bucket."""
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            return _refill(tokens, updated, rate, capacity, now)
+
+
+class SQLiteBucketStore(sqlite_store.SQLiteStore):
+    """Same interface, shared by every process that opens the same file."""
+
+    PRUNE_EVERY = 1000
+    # autocommit mode, so take() can open its own BEGIN IMMEDIATE
+    isolation_level = None
+
+    def __init__(self, path, idle_ttl=3600):
+        self.idle_ttl = idle_ttl
+        super().__init__(path)
+        self._calls = 0
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def take(self, key, rate, capacity, cost=1.0, debit=False, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            # the write lock makes read-refill-write atomic across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = capacity if row is None else _refill(row[0], row[1], rate, capacity, now)
+                allowed = debit or tokens >= cost
+                if allowed:
+                    tokens -= cost
+                self._conn.execute(
+                    "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    (key, tokens, now),
+                )
+                self._calls += 1
+                if self._calls % self.PRUNE_EVERY == 0:
+                    self._conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self.idle_ttl,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return allowed, tokens
+
+    def peek(self, key, rate, capacity, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+        return capacity if row is None else _refill(row[0], row[1], rate, capacity, now)
+
+
+class RateLimiter:
+    def __init__(self, store, name, per_minute, burst=None, window=60.0):
+        """`per_minute` requests per `window` seconds (0 disables), bursts of up to `burst`."""
+        self.store = store
+        self.name = name
+        self.rate = per_minute / window
+        self.capacity = float(burst if burst is not None else max(1, per_minute // 2))
+        self.enabled = per_minute > 0
+
+    def check(self, key, cost=1.0):
+        """0.0 if `key` may proceed (and is charged `cost`), else seconds until it may."""
+        if not self.enabled or key is None:
+            return 0.0
+        allowed, tokens = self.store.take(f"{self.name}:{key}", self.rate, self.capacity, cost)
+        if allowed:
+            return 0.0
+        return (cost - tokens) / self.rate
+
+
+class TokenBudget:
+    """A global model-token allowance per minute, debited from reported usage."""
+
+    def __init__(self, store, per_minute, key="budget:tokens"):
+        self.store = store
+        self.key = key
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.enabled = per_minute > 0
+
+    def retry_after(self):
+        """0.0 while there is budget left, else seconds until it is back out of debt."""
+        if not self.enabled:
+            return 0.0
+        tokens = self.store.peek(self.key, self.rate, self.capacity)
+        if tokens > 0:
+            return 0.0
+        return max(1.0, -tokens / self.rate)
+
+    def spend(self, tokens):
+        if self.enabled and tokens:
+            self.store.take(self.key, self.rate, self.capacity, cost=float(tokens), debit=True)
@@ -0,0 +1,196 @@
+# response_cache.py
+"""Reply cache for repeated questions.
+
+Questions are normalized (case, emoji and punctuation stripped) before
+lookup, so the suggestion buttons and their hand-typed variants share one
+entry. Entries expire after a TTL and the least recently used ones are
+evicted once the cache is full. Two backends are available: an in-process
+dict, and SQLite for sharing the cache between worker processes.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import sqlite_store
+
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_message(text):
+    """Lowercase, drop emoji/punctuation and collapse whitespace."""
+    text = _NON_WORD_RE.sub(" ", text.lower()).replace("_", " ")
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def similarity(a, b):
+    """Jaccard similarity of the word sets of two normalized messages."""
+    wa, wb = set(a.split()), set(b.split())
+    if not wa or not wb:
+        return 0.0
+    return len(wa & wb) / len(wa | wb)
+
+
+class MemoryBackend:
+    """In-process LRU store of key -> (value, expires_at)."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def keys(self, prefix):
+        with self._lock:
+            return [k for k in self._data if k.startswith(prefix)]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteBackend(sqlite_store.SQLiteStore):
+    """SQLite store shared by every process that opens the same file."""
+
+    def __init__(self, path, max_entries=512):
+        self.max_entries = max_entries
+        super().__init__(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE response_cache SET last_used = ? WHERE key = ?", (now, key))
+            return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now),
+            )
+            self._conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                "SELECT key FROM response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def keys(self, prefix):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM response_cache WHERE substr(key, 1, ?) = ? AND expires_at >= ?",
+                (len(prefix), prefix, time.time()),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM response_cache")
+
+
+class ResponseCache:
+    """Normalized-question cache with hit/miss counters.
+
+    ``namespace`` should identify the persona documents the reply was
+    generated from; when they change, the namespace changes and old entries
+    simply stop matching until they age out. ``min_similarity`` > 0 enables
+    a fuzzy fallback that reuses the closest cached question in the same
+    namespace.
+    """
+
+    def __init__(self, backend, ttl=3600, min_similarity=0.0, max_reply_chars=8000):
+        self.backend = backend
+        self.ttl = ttl
+        self.min_similarity = min_similarity
+        self.max_reply_chars = max_reply_chars
+        self.hits = 0
+        self.misses = 0
+        self.similar_hits = 0
+
+    @staticmethod
+    def _key(namespace, normalized):
+        return f"{namespace}|{normalized}"
+
+    def get(self, message, namespace):
+        normalized = normalize_message(message)
+        if not normalized:
+            return None
+        try:
+            reply = self.backend.get(self._key(namespace, normalized))
+            if reply is None and self.min_similarity > 0:
+                reply = self._get_similar(normalized, namespace)
+                if reply is not None:
+                    self.similar_hits += 1
+        except Exception as e:
+            logging.warning("Response cache read failed: %s", e)
+            reply = None
+        if reply is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return reply
+
+    def _get_similar(self, normalized, namespace):
+        prefix = self._key(namespace, "")
+        best_key, best_score = None, self.min_similarity
+        for key in self.backend.keys(prefix):
+            score = similarity(normalized, key[len(prefix):])
+            if score >= best_score:
+                best_key, best_score = key, score
+        return self.backend.get(best_key) if best_key else None
+
+    def set(self, message, namespace, reply):
+        normalized = normalize_message(message)
+        if not normalized or not reply or len(reply) > self.max_reply_chars:
+            return
+        try:
+            self.backend.set(self._key(namespace, normalized), reply, self.ttl)
+        except Exception as e:
+            logging.warning("Response cache write failed: %s", e)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "similar_hits": self.similar_hits,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
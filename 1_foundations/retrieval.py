@@ -0,0 +1,107 @@
+# retrieval.py
+"""Small local retrieval layer over the documents in me/.
+
+Documents are split into overlapping word windows and indexed with BM25.
+The index serializes to plain dicts so it can be stored in the profile
+artifact (see profile_artifact.py).
+"""
+import math
+import re
+from collections import Counter
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#]*")
+
+STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be been being both but by can could
+did do does doing down during each few for from further had has have having he her here hers
+him his how i if in into is it its itself just me more most my myself no nor not now of off on
+once only or other our ours out over own same she should so some such than that the their them
+then there these they this those through to too under until up very was we were what when where
+which while who whom why will with would you your yours yourself
+""".split())
+
+
+def tokenize(text):
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        # crude plural folding so "projects" matches "project"
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def chunk_text(text, source, max_words=120, overlap=30):
+    """Split text into overlapping windows of roughly max_words words."""
+    words = text.split()
+    if not words:
+        return []
+    chunks = []
+    step = max(1, max_words - overlap)
+    for start in range(0, len(words), step):
+        window = words[start:start + max_words]
+        chunks.append({"source": source, "text": " ".join(window)})
+        if start + max_words >= len(words):
+            break
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over a list of {"source", "text"} chunks using an inverted index."""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = []
+        self.postings = {}
+        for doc_id, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk["text"]))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+        self._finalize()
+
+    def _finalize(self):
+        n_docs = len(self.chunks)
+        self.avg_length = (sum(self.doc_lengths) / n_docs) if n_docs else 0.0
+        self.idf = {
+            term: math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def search(self, query, k=4):
+        """Return up to k (score, chunk) pairs, best first. Chunks with no matching term are skipped."""
+        scores = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / (self.avg_length or 1.0)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(score, self.chunks[doc_id]) for doc_id, score in best]
+
+    def to_dict(self):
+        return {
+            "chunks": self.chunks,
+            "k1": self.k1,
+            "b": self.b,
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls.__new__(cls)
+        index.chunks = data["chunks"]
+        index.k1 = data["k1"]
+        index.b = data["b"]
+        index.doc_lengths = data["doc_lengths"]
+        index.postings = {term: [tuple(p) for p in docs] for term, docs in data["postings"].items()}
+        index._finalize()
+        return index
+
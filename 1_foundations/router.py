@@ -0,0 +1,224 @@
+# router.py
+"""Pick which Gemini model answers a question, and hedge slow calls.
+
+ModelRouter sends short first questions to a cheaper, faster model and
+everything else to the default one. It keeps a rolling window of latencies
+and failures per model: a model whose recent error rate is too high is
+routed around while the other one is healthy. With hedging enabled, a call
+still running after `hedge_after` seconds is raced against the same call on
+the other model; the first success wins and the loser is cancelled.
+
+Available models are discovered once and cached on disk (see discover()),
+so restarts don't pay for a list_models round-trip.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+# Rolling window size per model, and how many samples are needed before the
+# window's statistics are trusted for routing decisions.
+WINDOW = 200
+MIN_SAMPLES = 10
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class LatencyTracker:
+    def __init__(self, window=WINDOW):
+        self._samples = deque(maxlen=window)  # (seconds, ok)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self._samples.append((seconds, ok))
+
+    def stats(self):
+        with self._lock:
+            samples = list(self._samples)
+        latencies = sorted(seconds for seconds, ok in samples if ok)
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            "count": len(samples),
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "error_rate": errors / len(samples) if samples else 0.0,
+        }
+
+
+class ModelRouter:
+    def __init__(self, default, fast=None, short_question_chars=80, max_error_rate=0.5, hedge_after=None):
+        """`hedge_after` is seconds, "p95" to use the primary's rolling p95, or None to disable hedging."""
+        self.default = default
+        self.fast = fast
+        self.short_question_chars = short_question_chars
+        self.max_error_rate = max_error_rate
+        self.hedge_after = hedge_after
+        self.available = None  # set by discover(); None means "not known, trust the configuration"
+        self._trackers = {name: LatencyTracker() for name in self.models()}
+        self.hedges = {"started": 0, "won": 0}
+
+    def models(self):
+        return [name for name in (self.default, self.fast) if name]
+
+    def discover(self, list_models, cache_path=None, ttl=86400):
+        """Learn which models the API key can use, from `cache_path` if fresh, else via list_models()."""
+        names = None
+        if cache_path is not None:
+            try:
+                if time.time() - cache_path.stat().st_mtime < ttl:
+                    names = json.loads(cache_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                names = None
+        if names is None:
+            names = list_models()
+            if names and cache_path is not None:
+                try:
+                    cache_path.parent.mkdir(parents=True, exist_ok=True)
+                    cache_path.write_text(json.dumps(names), encoding="utf-8")
+                except OSError as e:
+                    logging.warning("Could not cache model list to %s: %s", cache_path, e)
+        if not names:
+            logging.warning("Model discovery returned nothing; routing to configured models as-is")
+            return
+        self.available = set(names)
+        for name in self.models():
+            if name not in self.available:
+                logging.warning("Configured model %s is not available to this API key", name)
+        if self.fast and self.fast not in self.available:
+            logging.warning("Disabling fast-model routing to %s", self.fast)
+            self.fast = None
+
+    def tracker(self, model):
+        if model not in self._trackers:
+            self._trackers[model] = LatencyTracker()
+        return self._trackers[model]
+
+    def record(self, model, seconds, ok):
+        self.tracker(model).record(seconds, ok)
+
+    def _healthy(self, model):
+        stats = self.tracker(model).stats()
+        return stats["count"] < MIN_SAMPLES or stats["error_rate"] < self.max_error_rate
+
+    def alternate(self, model):
+        """The other configured model, or None if there is only one."""
+        others = [name for name in self.models() if name != model]
+        return others[0] if others else None
+
+    def is_simple(self, message, has_history):
+        text = message.strip()
+        return not has_history and len(text) <= self.short_question_chars and text.count("?") <= 1
+
+    def choose(self, message, has_history=False):
+        """Model for a question: the fast one for simple first questions, else the default, avoiding unhealthy ones."""
+        preferred = self.fast if self.fast and self.is_simple(message, has_history) else self.default
+        if not self._healthy(preferred):
+            other = self.alternate(preferred)
+            if other and self._healthy(other):
+                logging.info("Routing around %s (recent error rate too high) to %s", preferred, other)
+                return other
+        return preferred
+
+    def hedge_delay(self, model):
+        if self.hedge_after == "p95":
+            stats = self.tracker(model).stats()
+            return stats["p95"] if stats["count"] >= MIN_SAMPLES else None
+        return self.hedge_after
+
+    def call_sync(self, model, make_call):
+        """make_call(model), recording its latency and outcome."""
+        started = time.perf_counter()
+        try:
+            result = make_call(model)
+        except Exception:
+            self.record(model, time.perf_counter() - started, ok=False)
+            raise
+        self.record(model, time.perf_counter() - started, ok=True)
+        return result
+
+    async def call(self, model, make_call):
+        """Await make_call(model), recording its latency and outcome."""
+        started = time.perf_counter()
+        try:
+            result = await make_call(model)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.record(model, time.perf_counter() - started, ok=False)
+            raise
+        self.record(model, time.perf_counter() - started, ok=True)
+        return result
+
+    async def stream(self, model, make_stream):
+        """Iterate make_stream(model), recording the latency and outcome of the whole stream."""
+        started = time.perf_counter()
+        try:
+            async for item in make_stream(model):
+                yield item
+        except Exception:
+            self.record(model, time.perf_counter() - started, ok=False)
+            raise
+        self.record(model, time.perf_counter() - started, ok=True)
+
+    async def hedged(self, model, make_call):
+        """Return (model, result) from make_call(model), falling back to and hedging on the alternate model.
+
+        If `model` fails, the call is retried once on the alternate model. If
+        it hasn't answered within hedge_delay(), the same call is started on
+        the alternate model; whichever succeeds first wins and the other is
+        cancelled. If both fail, the first model's error is raised.
+        """
+        delay = self.hedge_delay(model)
+        backup = self.alternate(model)
+        first = asyncio.ensure_future(self.call(model, make_call))
+        tasks = {first: model}
+        try:
+            if delay is not None and backup is not None:
+                done, _ = await asyncio.wait({first}, timeout=delay)
+                if not done:
+                    return await self._race(tasks, model, delay, backup, make_call)
+            try:
+                return model, await first
+            except Exception as e:
+                if backup is None:
+                    raise
+                logging.warning("%s failed (%s), retrying on %s", model, e, backup)
+            return backup, await self.call(backup, make_call)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _race(self, tasks, model, delay, backup, make_call):
+        logging.info("%s slower than %.2fs, hedging with %s", model, delay, backup)
+        self.hedges["started"] += 1
+        tasks[asyncio.ensure_future(self.call(backup, make_call))] = backup
+        pending = set(tasks)
+        first_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if tasks[task] == backup:
+                        self.hedges["won"] += 1
+                    return tasks[task], task.result()
+                if tasks[task] == model:
+                    first_error = task.exception()
+        raise first_error
+
+    def stats(self):
+        return {
+            "default": self.default,
+            "fast": self.fast,
+            "hedge_after": self.hedge_after,
+            "hedges": dict(self.hedges),
+            "models": {name: tracker.stats() for name, tracker in self._trackers.items()},
+        }
@@ -0,0 +1,174 @@
+# scope.py
+"""Local scope pre-classifier: is a question about the persona at all?
+
+A TF-IDF + logistic regression model over word unigrams and bigrams, in
+pure Python (sparse dicts; the vocabulary is a few thousand terms), trained
+from the labeled questions in me/scope_examples.json plus the profile
+chunks as in-scope examples. Scoring a question is one tokenization and a
+few dozen dict lookups, around ten microseconds, so it can run before
+every model call.
+
+Only confident predictions are acted on: a question whose out-of-scope
+probability reaches `threshold` is answered with a fixed reply and recorded
+without calling the model. The model has no intercept, so a question that
+shares no words with the training set scores 0.5 and is left to the model,
+as is anything it isn't sure about. So is a question whose only
+out-of-scope evidence is its phrasing ("tell me ..."; see PHRASING_WORDS).
+bench_scope.py reports accuracy on the held-out prompts in test_prompts.py
+across thresholds, and fails if a frontend suggestion prompt is declined.
+
+The trained weights are stored in the profile artifact (see
+profile_artifact.py) next to a hash of the examples file, so startup only
+retrains when the examples changed since the build.
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import re
+from collections import Counter
+from pathlib import Path
+
+from retrieval import STOPWORDS
+
+EXAMPLES_PATH = Path(os.getenv("SCOPE_EXAMPLES_PATH", Path(__file__).resolve().parent / "me" / "scope_examples.json"))
+
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9+#]*")
+# "what's" -> "what", "don't" -> "do"; otherwise the "s" and "t" become terms of their own
+_CLITIC_RE = re.compile(r"(?:n't|'(?:s|re|ve|ll|d|m))\b")
+# how a question is asked, not what it is about: "tell me a riddle" and
+# "tell me about yourself" differ only in their other terms
+PHRASING_WORDS = frozenset("""
+ask describe explain give know let please say share show talk tell think want
+""".split())
+
+
+def terms(text):
+    """Unigrams and bigrams of the lowercased words, with crude plural folding.
+
+    Terms made only of stopwords ("what", "is it", "there a") are dropped:
+    they appear in questions of both kinds, and would otherwise let a short
+    question be judged on its phrasing rather than its subject.
+    """
+    words = []
+    for word in _WORD_RE.findall(_CLITIC_RE.sub("", text.lower().replace("’", "'"))):
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss") and word not in STOPWORDS:
+            word = word[:-1]
+        words.append(word)
+    unigrams = [word for word in words if word not in STOPWORDS]
+    bigrams = [f"{a} {b}" for a, b in zip(words, words[1:]) if a not in STOPWORDS or b not in STOPWORDS]
+    return unigrams + bigrams
+
+
+def is_phrasing(term):
+    """True for a term made only of stopwords and PHRASING_WORDS ("tell", "tell me", "think about")."""
+    return all(word in STOPWORDS or word in PHRASING_WORDS for word in term.split())
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+
+def load_examples(path=EXAMPLES_PATH):
+    """(in_scope, out_of_scope) question lists."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data["in_scope"], data["out_of_scope"]
+
+
+def examples_hash(path=EXAMPLES_PATH):
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def train_for_profile(chunks, path=EXAMPLES_PATH, threshold=0.8):
+    """Train on the labeled examples, with the profile's retrieval chunks as extra in-scope texts."""
+    in_scope, out_of_scope = load_examples(path)
+    return ScopeClassifier.train(in_scope + [chunk["text"] for chunk in chunks], out_of_scope, threshold)
+
+
+class ScopeClassifier:
+    def __init__(self, idf, weights, threshold=0.8):
+        self.idf = idf
+        self.weights = weights
+        self.threshold = threshold
+        self._phrasing = frozenset(term for term in idf if is_phrasing(term))
+
+    def vector(self, text):
+        """L2-normalized TF-IDF vector of `text` over the training vocabulary."""
+        counts = Counter(term for term in terms(text) if term in self.idf)
+        vec = {term: (1.0 + math.log(tf)) * self.idf[term] for term, tf in counts.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values()))
+        return {term: v / norm for term, v in vec.items()} if norm else {}
+
+    def probability(self, text):
+        """Probability that `text` is out of scope.
+
+        At most 0.5 unless a term other than phrasing carries out-of-scope
+        weight: "Tell me about your college" is not declined for its "tell me".
+        """
+        weights = self.weights
+        vec = self.vector(text)
+        p = _sigmoid(sum(weights.get(term, 0.0) * v for term, v in vec.items()))
+        if p > 0.5 and not any(weights.get(term, 0.0) > 0 for term in vec if term not in self._phrasing):
+            return 0.5
+        return p
+
+    def is_out_of_scope(self, text):
+        return self.probability(text) >= self.threshold
+
+    @classmethod
+    def train(cls, in_scope, out_of_scope, threshold=0.8, epochs=30, learning_rate=2.0, seed=0):
+        """Fit on labeled texts by SGD with balanced class weights.
+
+        There is no intercept: a text sharing no terms with the training set
+        scores exactly 0.5, so it is never confidently out of scope.
+        """
+        if not in_scope or not out_of_scope:
+            raise ValueError("need examples of both classes")
+        texts = list(in_scope) + list(out_of_scope)
+        labels = [0] * len(in_scope) + [1] * len(out_of_scope)
+        n = len(texts)
+        df = Counter(term for text in texts for term in set(terms(text)))
+        model = cls({term: math.log((1 + n) / (1 + d)) + 1.0 for term, d in df.items()}, {}, threshold)
+        examples = [(model.vector(text), label) for text, label in zip(texts, labels)]
+        # each class carries the same total weight, however many examples it has
+        class_weight = {0: n / (2 * len(in_scope)), 1: n / (2 * len(out_of_scope))}
+
+        weights = {}
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(examples)
+            rate = learning_rate / (1 + 0.1 * epoch)
+            for vec, label in examples:
+                z = sum(weights.get(term, 0.0) * v for term, v in vec.items())
+                step = rate * (_sigmoid(z) - label) * class_weight[label]
+                for term, v in vec.items():
+                    weights[term] = weights.get(term, 0.0) - step * v
+        model.weights = {term: round(w, 6) for term, w in weights.items()}
+        return model
+
+    def to_dict(self):
+        return {"idf": self.idf, "weights": self.weights}
+
+    @classmethod
+    def from_dict(cls, data, threshold=0.8):
+        return cls(data["idf"], data["weights"], threshold)
+
+    def evaluate(self, in_scope, out_of_scope, threshold=None):
+        """Accuracy, precision and recall of the out-of-scope decision on labeled texts."""
+        threshold = self.threshold if threshold is None else threshold
+        tp = sum(1 for text in out_of_scope if self.probability(text) >= threshold)
+        fp = sum(1 for text in in_scope if self.probability(text) >= threshold)
+        total = len(in_scope) + len(out_of_scope)
+        return {
+            "threshold": threshold,
+            "accuracy": round((tp + len(in_scope) - fp) / total, 4) if total else None,
+            "precision": round(tp / (tp + fp), 4) if tp + fp else None,
+            "recall": round(tp / len(out_of_scope), 4) if out_of_scope else None,
+            "short_circuited": tp + fp,
+            "false_positives": fp,
+        }
@@ -0,0 +1,162 @@
+# sessions.py
+"""Server-side conversation store keyed by session_id.
+
+Clients send only the new message plus the session_id returned with the
+previous reply; the turns live here. Each session is an append-only list
+of compact (role, text) tuples capped at ``max_turns``: once a session
+grows past the cap, its oldest turns are replaced by their one-line
+summaries, which is all the context window would use of them anyway.
+Idle sessions expire after ``ttl`` seconds and the least recently used are
+evicted beyond ``max_sessions``.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import conversation
+import sqlite_store
+
+
+def new_session_id():
+    return secrets.token_urlsafe(16)
+
+
+def _compact(turns, max_turns, keep_verbatim):
+    """Summarize the oldest turns once the list grows past max_turns."""
+    if len(turns) <= max_turns:
+        return turns
+    cutoff = len(turns) - keep_verbatim
+    return [
+        (role, conversation.first_sentence(text)) if i < cutoff else (role, text)
+        for i, (role, text) in enumerate(turns)
+    ][-max_turns:]
+
+
+def _as_history(turns):
+    return [{"role": role, "text": text} for role, text in turns]
+
+
+class MemorySessionStore:
+    def __init__(self, ttl=1800, max_sessions=5000, max_turns=24, keep_verbatim=8):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.keep_verbatim = keep_verbatim
+        self._sessions = OrderedDict()  # session_id -> (last_seen, [(role, text), ...])
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """History for a live session as [{"role", "text"}, ...], or None if unknown/expired."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            last_seen, turns = entry
+            if last_seen + self.ttl < time.time():
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return _as_history(turns)
+
+    def append(self, session_id, turns):
+        """Append (role, text) turns, creating the session if needed."""
+        with self._lock:
+            _, existing = self._sessions.pop(session_id, (0, []))
+            existing = _compact(existing + list(turns), self.max_turns, self.keep_verbatim)
+            self._sessions[session_id] = (time.time(), existing)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(sqlite_store.SQLiteStore):
+    """Same interface, persisted in SQLite so sessions survive restarts and span workers."""
+
+    def __init__(self, path, ttl=1800, max_sessions=5000, max_turns=24, keep_verbatim=8):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.keep_verbatim = keep_verbatim
+        super().__init__(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_turns ("
+                "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, text TEXT NOT NULL, "
+                "PRIMARY KEY (session_id, seq))"
+            )
+
+    def _turns(self, session_id):
+        rows = self._conn.execute(
+            "SELECT role, text FROM session_turns WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        return [(role, text) for role, text in rows]
+
+    def get(self, session_id):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT last_seen FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] + self.ttl < now:
+                self._delete(session_id)
+                return None
+            self._conn.execute("UPDATE sessions SET last_seen = ? WHERE session_id = ?", (now, session_id))
+            return _as_history(self._turns(session_id))
+
+    def append(self, session_id, turns):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, last_seen) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_seen = excluded.last_seen",
+                (session_id, now),
+            )
+            row = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0), COUNT(*) FROM session_turns WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            seq, count = row
+            self._conn.executemany(
+                "INSERT INTO session_turns (session_id, seq, role, text) VALUES (?, ?, ?, ?)",
+                [(session_id, seq + i + 1, role, text) for i, (role, text) in enumerate(turns)],
+            )
+            if count + len(turns) > self.max_turns:
+                compacted = _compact(self._turns(session_id), self.max_turns, self.keep_verbatim)
+                self._conn.execute("DELETE FROM session_turns WHERE session_id = ?", (session_id,))
+                self._conn.executemany(
+                    "INSERT INTO session_turns (session_id, seq, role, text) VALUES (?, ?, ?, ?)",
+                    [(session_id, i + 1, role, text) for i, (role, text) in enumerate(compacted)],
+                )
+            self._evict(now)
+
+    def _evict(self, now):
+        expired = [r[0] for r in self._conn.execute(
+            "SELECT session_id FROM sessions WHERE last_seen < ? UNION "
+            "SELECT session_id FROM (SELECT session_id FROM sessions ORDER BY last_seen DESC LIMIT -1 OFFSET ?)",
+            (now - self.ttl, self.max_sessions),
+        ).fetchall()]
+        for session_id in expired:
+            self._delete(session_id)
+
+    def _delete(self, session_id):
+        self._conn.execute("DELETE FROM session_turns WHERE session_id = ?", (session_id,))
+        self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def delete(self, session_id):
+        with self._lock, self._conn:
+            self._delete(session_id)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
@@ -0,0 +1,42 @@
+# sqlite_store.py
+"""Connection handling shared by the SQLite-backed stores.
+
+Sessions, the reply cache and the rate-limit buckets each keep one
+connection per process, guarded by a lock, in WAL mode with
+synchronous=NORMAL: a commit waits for the WAL write but not for an fsync,
+which only matters on power loss, and nothing here is worth an fsync per
+request.
+
+A connection must not be used across fork() (gunicorn preloads the app in
+the master), so each child reopens its own. The inherited connection is
+kept referenced rather than closed: closing it in the child could
+checkpoint or remove the WAL from under the parent.
+"""
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    # sqlite3's default: each write statement opens a transaction, committed by `with self._conn`
+    isolation_level = ""
+
+    def __init__(self, path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._inherited = []
+        self._connect()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reconnect)
+
+    def _connect(self):
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=5, check_same_thread=False, isolation_level=self.isolation_level,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+
+    def _reconnect(self):
+        self._inherited.append(self._conn)
+        self._connect()
@@ -58,6 +58,73 @@ TEST_PROMPTS = [
     "How can I contact you?",
 ]
 
+# The relevant questions at the end of TEST_PROMPTS; every other prompt should
+# be recorded with record_unknown_question (bench_load.py checks this).
+IN_SCOPE_PROMPTS = TEST_PROMPTS[-5:]
+
+# The suggestion chips in frontend/index.html and frontend/src/components/Chat.jsx
+# (and app.SUGGESTION_PROMPTS, which warms the reply cache with them). Every
+# visitor sees these, so bench_scope.py fails if the scope pre-classifier
+# declines any of them; keep this list in step with the frontends.
+SUGGESTION_PROMPTS = [
+    "💼 Tell me about yourself",
+    "🎯 What are your skills?",
+    "🎯 What are your key skills?",
+    "📄 Send me your resume",
+    "🚀 Show me your projects",
+    "🚀 What projects have you built?",
+    "💬 How can I contact you?",
+]
+
+# More in-scope questions, phrased the way visitors and recruiters actually
+# ask them: greetings, "what's your ..." questions, and short first messages
+# that read like follow-ups, and "tell me about ..." questions. Not sent by
+# bench_load.py; bench_scope.py fails if the scope pre-classifier declines any.
+HELD_OUT_IN_SCOPE_PROMPTS = [
+    "Hi there",
+    "Hello there!",
+    "Hey!",
+    "Good evening",
+    "Thanks for the info!",
+    "What is it?",
+    "Is there a demo?",
+    "Any side projects?",
+    "What's your notice period?",
+    "What's your availability?",
+    "What's your biggest achievement?",
+    "What's your expected salary?",
+    "What's your current CTC?",
+    "What's your preferred location?",
+    "What's your favourite programming language?",
+    "What's your typical day like at work?",
+    "What's the stack behind this site?",
+    "Is there a portfolio site?",
+    "Do you have a website?",
+    "Are you an immediate joiner?",
+    "Can you relocate to Bangalore?",
+    "Are you a fresher?",
+    "Which project are you most proud of?",
+    "How did you get into AI?",
+    "What do you enjoy most about your job?",
+    "What tools do you use for deployment?",
+    "Tell me about your internship",
+    "Can you send me your CV?",
+    "What was your role in the team?",
+    "Have you mentored anyone?",
+    "Can you tell me about yourself?",
+    "Tell me more about yourself",
+    "Tell me about your journey",
+    "Tell me about your achievements",
+    "Tell me about your college",
+    "Tell me about your last company",
+    "Tell me a challenge you faced",
+    "Tell me a fun fact about you",
+    "Please describe your background",
+    "Explain your role at your current job",
+    "What do you think about AI?",
+    "Talk me through your resume",
+]
+
 if __name__ == "__main__":
     print("Test Prompts for record_unknown_question functionality\n")
     print("=" * 70)
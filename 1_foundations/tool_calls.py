@@ -0,0 +1,172 @@
+# tool_calls.py
+"""Find tool-call JSON in model replies, whole or streamed.
+
+The model is asked to call tools by writing a JSON object such as
+{"tool": "record_user_details", "args": {...}}, either inline or in a
+```json fence. ToolCallScanner reads the reply in chunks, releases display
+text as soon as it cannot be part of a tool block, and holds a candidate
+block back until it is complete. Inline objects are matched with a
+string-aware brace counter, so nested args and braces inside strings are
+handled, and each character is examined once: the scan resumes where the
+previous chunk stopped. A fence holding a JSON array of tool objects counts
+as several calls.
+
+parse_tool_calls() runs the same scanner over a complete reply and returns
+the cleaned display text together with every call found.
+"""
+import json
+import re
+
+FENCE = "```json"
+FENCE_CLOSE = "```"
+TOOL_KEY = '"tool"'
+
+# Candidate blocks longer than this are given up on and released as text,
+# so a stray '{"tool"' cannot hold back the rest of a streamed reply.
+MAX_BLOCK_CHARS = 8192
+
+_START_RE = re.compile(r"[{`]")
+_INLINE_OPEN_RE = re.compile(r"\{\s*")
+_OUTSIDE_STRING_RE = re.compile(r'[{}"]')
+_INSIDE_STRING_RE = re.compile(r'["\\]')
+
+
+def _as_calls(value):
+    """Tool calls in a decoded JSON value, or None if it is not a tool block."""
+    items = value if isinstance(value, list) else [value]
+    if items and all(isinstance(item, dict) and "tool" in item for item in items):
+        return items
+    return None
+
+
+class ToolCallScanner:
+    def __init__(self, max_block_chars=MAX_BLOCK_CHARS):
+        self.max_block_chars = max_block_chars
+        self.calls = []
+        self._released = []
+        self._pending = ""  # unreleased text; a candidate block always starts at 0
+        self._reset_block()
+
+    def _reset_block(self):
+        self._kind = None  # None while looking for a block, else "inline" or "fence"
+        self._pos = 0      # where the scan of the candidate block resumes
+        self._depth = 0
+        self._in_string = False
+
+    @property
+    def text(self):
+        """Display text released so far."""
+        return "".join(self._released)
+
+    def feed(self, chunk):
+        """Add a chunk of the reply; return the display text it releases."""
+        text = self._pending + chunk
+        out = []
+        start = 0  # everything before this has been released or consumed
+        while start < len(text):
+            if self._kind is None:
+                match = _START_RE.search(text, start)
+                if match is None:
+                    out.append(text[start:])
+                    start = len(text)
+                    break
+                out.append(text[start:match.start()])
+                start = match.start()
+                status = self._open_block(text, start)
+                if status == "wait":
+                    break
+                if status == "text":
+                    out.append(text[start])
+                    start += 1
+                continue
+            end = self._scan_fence(text, start) if self._kind == "fence" else self._scan_inline(text)
+            if end is None:
+                if self.max_block_chars is not None and len(text) - start > self.max_block_chars:
+                    out.append(text[start:])
+                    start = len(text)
+                    self._reset_block()
+                break
+            self._close_block(text[start:end], out)
+            start = end
+        self._pending = text[start:]
+        self._pos -= start
+        released = "".join(out)
+        self._released.append(released)
+        return released
+
+    def flush(self):
+        """Release whatever is still held back once the reply has ended."""
+        rest, self._pending = self._pending, ""
+        self._reset_block()
+        self._released.append(rest)
+        return rest
+
+    def _open_block(self, text, idx):
+        """Classify the '{' or '`' at idx: "block", "text", or "wait" for more input."""
+        if text[idx] == "`":
+            if text.startswith(FENCE, idx):
+                self._kind = "fence"
+                self._pos = idx + len(FENCE)
+                return "block"
+            return "wait" if FENCE.startswith(text[idx:idx + len(FENCE)]) and len(text) - idx < len(FENCE) else "text"
+        key_start = _INLINE_OPEN_RE.match(text, idx).end()
+        if text.startswith(TOOL_KEY, key_start):
+            self._kind = "inline"
+            self._pos = idx + 1
+            self._depth = 1
+            return "block"
+        head = text[key_start:key_start + len(TOOL_KEY)]
+        return "wait" if len(head) < len(TOOL_KEY) and TOOL_KEY.startswith(head) else "text"
+
+    def _close_block(self, block, out):
+        body = block[len(FENCE):-len(FENCE_CLOSE)] if self._kind == "fence" else block
+        self._reset_block()
+        try:
+            calls = _as_calls(json.loads(body))
+        except ValueError:
+            calls = None
+        if calls is None:
+            out.append(block)
+        else:
+            self.calls.extend(calls)
+
+    def _scan_fence(self, text, start):
+        close = text.find(FENCE_CLOSE, self._pos)
+        if close < 0:
+            # the closing fence may straddle the next chunk
+            self._pos = max(start + len(FENCE), len(text) - len(FENCE_CLOSE) + 1)
+            return None
+        return close + len(FENCE_CLOSE)
+
+    def _scan_inline(self, text):
+        pos = self._pos
+        while True:
+            pattern = _INSIDE_STRING_RE if self._in_string else _OUTSIDE_STRING_RE
+            match = pattern.search(text, pos)
+            if match is None:
+                self._pos = len(text)
+                return None
+            char = match.group()
+            pos = match.end()
+            if char == "\\":
+                if pos >= len(text):
+                    # resume at the backslash once the escaped character arrives
+                    self._pos = match.start()
+                    return None
+                pos += 1
+            elif char == '"':
+                self._in_string = not self._in_string
+            elif char == "{":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    return pos
+
+
+def parse_tool_calls(text):
+    """Return (display_text, calls) for a complete reply."""
+    scanner = ToolCallScanner(max_block_chars=None)
+    scanner.feed(text or "")
+    scanner.flush()
+    return scanner.text, scanner.calls
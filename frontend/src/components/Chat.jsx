@@ -1,6 +1,50 @@
 import { useState } from "react";
 import "./Chat.css";
 
+// POST to /chat/stream and call onText with the growing reply as Server-Sent
+// Events arrive. The final `done` event carries the cleaned-up reply and the
+// session id to send with the next message. A 409 means the server no longer
+// has the session; it comes back as { sessionReset: true }.
+async function streamChat(apiUrl, body, onText) {
+  const res = await fetch(`${apiUrl}/chat/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body)
+  });
+  if (res.status === 409) return { sessionReset: true };
+  if (!res.ok || !res.body) throw new Error("Failed to get response");
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let reply = "";
+  let sessionId = null;
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      const event = (raw.match(/^event: (.*)$/m) || [])[1];
+      const data = (raw.match(/^data: (.*)$/m) || [])[1];
+      if (!data) continue;
+      const payload = JSON.parse(data);
+      if (event === "delta") {
+        reply += payload.text;
+      } else if (event === "done") {
+        reply = payload.reply;
+        sessionId = payload.session_id || null;
+      } else if (event === "error") {
+        throw new Error(payload.detail);
+      }
+      onText(reply);
+    }
+  }
+  return { reply, sessionId };
+}
+
 export default function Chat() {
   // Chat component for Priyanshu AI Assistant
   // Backend: Render.com (permanent free hosting)
@@ -9,6 +53,9 @@ export default function Chat() {
   ]);
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
+  const [streaming, setStreaming] = useState(false);
+  // The server keeps the conversation; only the new message and this id are sent.
+  const [sessionId, setSessionId] = useState(null);
 
   const suggestions = [
     "💼 Tell me about yourself",
@@ -30,24 +77,23 @@ export default function Chat() {
     const API_URL = 'https://priyanshu-ai-chat-assistant.onrender.com';
 
     try {
-      const res = await fetch(`${API_URL}/chat`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          message: text,
-          history: newMessages
-        })
-      });
-
-      if (!res.ok) throw new Error("Failed to get response");
-      
-      const data = await res.json();
-      setMessages([...newMessages, { role: "bot", text: data.reply }]);
+      const onText = (reply) => {
+        setStreaming(true);
+        setMessages([...newMessages, { role: "bot", text: reply }]);
+      };
+      const body = sessionId ? { message: text, session_id: sessionId } : { message: text, history: newMessages };
+      let result = await streamChat(API_URL, body, onText);
+      if (result.sessionReset) {
+        // the server lost the conversation (expired or restarted); rebuild it from ours
+        result = await streamChat(API_URL, { message: text, history: newMessages }, onText);
+      }
+      if (result.sessionId) setSessionId(result.sessionId);
     } catch (error) {
       console.error("Error:", error);
       setMessages([...newMessages, { role: "bot", text: "Sorry, I encountered an error. Please try again." }]);
     } finally {
       setLoading(false);
+      setStreaming(false);
     }
   };
 
@@ -69,7 +115,7 @@ export default function Chat() {
             </div>
           </div>
         ))}
-        {loading && (
+        {loading && !streaming && (
           <div className="message bot">
             <div className="message-bubble loading">
               ⏳ Thinking...